@@ -0,0 +1,259 @@
+"""
+Snapshot do Catálogo - SwiftShop
+Cópia imutável e versionada do catálogo em memória, com os produtos já
+serializados e as ordenações por categoria montadas. Leituras usam a
+referência atual sem lock; escritas montam um snapshot novo a partir do
+anterior e trocam a referência de uma vez (read-copy-update).
+
+CATALOG_SNAPSHOT=local   um único worker: confia nas escritas deste processo
+CATALOG_SNAPSHOT=shared  vários workers: confere a versão do catálogo no banco a cada leitura
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+
+MODE = os.environ.get("CATALOG_SNAPSHOT", "").strip().lower()
+enabled = MODE in ("local", "shared")
+
+
+@dataclass(frozen=True)
+class SnapshotEntry:
+    """Produto já serializado; os nomes seguem as colunas usadas pelos cursores do catálogo"""
+    id: int
+    version: int
+    name: str
+    price: float
+    stock: int
+    rating_avg: float
+    main_category_norm: Optional[str]
+    sub_category_norm: Optional[str]
+    out: Any    # ProductOut
+    card: Any   # ProductCard
+
+
+# Colunas de cada ordenação (mesmas de PRODUCT_SORTS) e se é decrescente
+SORTS: Dict[str, Tuple[Tuple[str, ...], bool]] = {
+    "name": (("name", "id"), False),
+    "price": (("price", "id"), False),
+    "-price": (("price", "id"), True),
+    "newest": (("id",), True),
+    "rating": (("rating_avg", "id"), True),
+}
+
+
+def _order_key(values: tuple, descending: bool) -> tuple:
+    # Ordenações decrescentes são todas numéricas: negar deixa tudo crescente para o bisect
+    return tuple(-v for v in values) if descending else values
+
+
+def _entry_key(entry: SnapshotEntry, sort: str) -> tuple:
+    columns, descending = SORTS[sort]
+    return _order_key(tuple(getattr(entry, c) for c in columns), descending)
+
+
+def _groups(entry: SnapshotEntry) -> Tuple[Optional[str], ...]:
+    """Ordenações em que o produto aparece: o catálogo inteiro (None) e a categoria principal"""
+    if entry.main_category_norm:
+        return (None, entry.main_category_norm)
+    if entry.main_category_norm is None and entry.sub_category_norm:
+        # Mesma regra do filtro no banco: main_category NULL (não "") com sub_category conta como Vestuário
+        return (None, "vestuario")
+    return (None,)
+
+
+def _placement(entry: SnapshotEntry) -> tuple:
+    """Tudo que decide onde o produto fica nas ordenações; estoque não entra (só filtra)"""
+    return _groups(entry), tuple(_entry_key(entry, sort) for sort in SORTS)
+
+
+class _Ordering:
+    """Chaves ordenadas e ids na mesma posição; nunca alterada depois de publicada"""
+    __slots__ = ("keys", "ids")
+
+    def __init__(self, keys: List[tuple], ids: List[int]):
+        self.keys = keys
+        self.ids = ids
+
+    @classmethod
+    def build(cls, entries: Iterable[SnapshotEntry], sort: str) -> "_Ordering":
+        pairs = sorted((_entry_key(e, sort), e.id) for e in entries)
+        return cls([k for k, _ in pairs], [i for _, i in pairs])
+
+    def edited(self, removed: Iterable[tuple], inserted: Iterable[Tuple[tuple, int]]) -> "_Ordering":
+        """Cópia com as chaves removidas/inseridas por bisect; as chaves terminam no id, então são únicas"""
+        keys, ids = list(self.keys), list(self.ids)
+        for key in removed:
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+                del ids[i]
+        for key, product_id in inserted:
+            i = bisect_left(keys, key)
+            keys.insert(i, key)
+            ids.insert(i, product_id)
+        return _Ordering(keys, ids)
+
+
+class CatalogSnapshot:
+    def __init__(self, version: int, entries: Iterable[SnapshotEntry]):
+        by_id = {e.id: e for e in entries}
+        groups: Dict[Optional[str], List[SnapshotEntry]] = defaultdict(list)
+        for e in by_id.values():
+            for group in _groups(e):
+                groups[group].append(e)
+        self._publish(version, by_id, {
+            (sort, group): _Ordering.build(members, sort)
+            for group, members in groups.items()
+            for sort in SORTS
+        })
+
+    def _publish(self, version: int, by_id: Dict[int, SnapshotEntry], orderings: Dict[tuple, _Ordering]) -> None:
+        self.version = version
+        self.by_id = MappingProxyType(by_id)
+        self._orderings = MappingProxyType(orderings)
+
+    def replace(self, version: int, upserts: Iterable[SnapshotEntry], removed: Iterable[int] = ()) -> "CatalogSnapshot":
+        """
+        Novo snapshot com as mudanças aplicadas; este continua intacto para quem já o está lendo.
+        Só as ordenações em que um produto mudou de posição são copiadas e editadas por bisect;
+        mudança só de estoque (a de todo pedido) troca a entrada e reaproveita todas as ordenações
+        """
+        by_id = dict(self.by_id)
+        edits: Dict[tuple, Tuple[List[tuple], List[Tuple[tuple, int]]]] = defaultdict(lambda: ([], []))
+
+        def move(entry: SnapshotEntry, slot: int) -> None:
+            for group in _groups(entry):
+                for sort in SORTS:
+                    key = _entry_key(entry, sort)
+                    edits[(sort, group)][slot].append(key if slot == 0 else (key, entry.id))
+
+        for product_id in removed:
+            old = by_id.pop(product_id, None)
+            if old is not None:
+                move(old, 0)
+        for entry in upserts:
+            old = by_id.get(entry.id)
+            by_id[entry.id] = entry
+            if old is not None and _placement(old) == _placement(entry):
+                continue
+            if old is not None:
+                move(old, 0)
+            move(entry, 1)
+
+        orderings = dict(self._orderings)
+        for slot, (removed_keys, inserted) in edits.items():
+            ordering = orderings.get(slot) or _Ordering([], [])
+            orderings[slot] = ordering.edited(removed_keys, inserted)
+        snap = CatalogSnapshot.__new__(CatalogSnapshot)
+        snap._publish(version, by_id, orderings)
+        return snap
+
+    def select(
+        self,
+        sort: str = "name",
+        main_category: Optional[str] = None,
+        sub_category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False,
+        after: Optional[tuple] = None,
+        limit: Optional[int] = None,
+    ) -> List[SnapshotEntry]:
+        """Produtos filtrados na ordem de sort; main/sub_category já normalizados (fold_text)"""
+        ordering = self._orderings.get((sort, main_category or None))
+        if ordering is None:
+            return []
+        start = 0
+        if after is not None:
+            start = bisect_right(ordering.keys, _order_key(tuple(after), SORTS[sort][1]))
+        out: List[SnapshotEntry] = []
+        for product_id in ordering.ids[start:]:
+            entry = self.by_id[product_id]
+            if sub_category and entry.sub_category_norm != sub_category:
+                continue
+            if min_price is not None and entry.price < min_price:
+                continue
+            if max_price is not None and entry.price > max_price:
+                continue
+            if in_stock and not entry.stock > 0:
+                continue
+            out.append(entry)
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_lock = threading.Lock()
+
+
+def get(
+    db_version: Callable[[], int],
+    loader: Callable[[], Tuple[int, Iterable[SnapshotEntry]]],
+    changes: Optional[Callable[[int], Optional[Tuple[int, Iterable[SnapshotEntry], Iterable[int]]]]] = None,
+) -> Optional[CatalogSnapshot]:
+    """
+    Snapshot atual. None quando desativado ou quando outro thread já está
+    reconstruindo: nesse caso a requisição vai ao banco em vez de esperar.
+    Em modo shared, um snapshot atrasado tenta primeiro changes(versão atual):
+    (nova versão, upserts, removidos) desde ela, ou None quando o histórico
+    não cobre todas as versões; só então recarrega o catálogo inteiro
+    """
+    global _snapshot
+    if not enabled:
+        return None
+    snap = _snapshot
+    version = db_version() if MODE == "shared" else None
+    if snap is not None and (version is None or snap.version >= version):
+        return snap
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        snap = _snapshot
+        if snap is not None and version is not None and snap.version < version and changes is not None:
+            delta = changes(snap.version)
+            if delta is not None:
+                snap = snap.replace(*delta)
+                _snapshot = snap
+        if snap is None or (version is not None and snap.version < version):
+            loaded_version, entries = loader()
+            snap = CatalogSnapshot(loaded_version, entries)
+            _snapshot = snap
+        return snap
+    finally:
+        _lock.release()
+
+
+def apply(version: int, upserts: Iterable[SnapshotEntry] = (), removed: Iterable[int] = ()) -> None:
+    """
+    Chamar depois do commit de uma escrita, com a versão do catálogo já
+    incrementada. Se houve outra escrita no meio (versão pulada), descarta
+    o snapshot e a próxima leitura reconstrói a partir do banco
+    """
+    global _snapshot
+    if not enabled:
+        return
+    with _lock:
+        snap = _snapshot
+        if snap is None or snap.version >= version:
+            return
+        _snapshot = snap.replace(version, upserts, removed) if snap.version == version - 1 else None
+
+
+def invalidate() -> None:
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def stats() -> Dict[str, Any]:
+    snap = _snapshot
+    return {
+        "mode": MODE or "off",
+        "version": snap.version if snap is not None else None,
+        "products": len(snap.by_id) if snap is not None else 0,
+    }
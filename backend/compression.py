@@ -0,0 +1,212 @@
+"""
+Compressão de Respostas - SwiftShop
+gzip (e brotli, quando o pacote opcional está instalado) negociados pelo
+Accept-Encoding. Corpos servidos com ETag ficam guardados já comprimidos,
+então cada versão do catálogo é serializada e comprimida uma única vez
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import gzip
+import os
+import threading
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Corpos menores que isso saem sem compressão
+MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+IDENTITY = "identity"
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """br quando disponível e aceito, senão gzip; None se o cliente não aceita nenhum"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name.strip():
+            accepted[name.strip()] = q
+    for encoding in (("br",) if brotli else ()) + ("gzip",):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    """Corpos que vão para o cache são comprimidos uma vez só, então usam nível mais alto"""
+    if encoding == "br":
+        return brotli.compress(body, quality=9 if cached else 5)
+    return gzip.compress(body, compresslevel=9 if cached else 6)
+
+
+class CompressedBodyCache:
+    """LRU (etag, encoding) -> bytes, limitado pelo total de bytes guardados"""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._data.get((etag, encoding))
+            if body is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end((etag, encoding))
+            self.hits += 1
+            return body
+
+    def put(self, etag: str, encoding: str, body: bytes) -> None:
+        # Um corpo enorme não pode esvaziar o cache sozinho
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._data.pop((etag, encoding), None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[(etag, encoding)] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+body_cache = CompressedBodyCache(max_bytes=int(os.environ.get("RESPONSE_CACHE_MB", 32)) * 1024 * 1024)
+
+
+def cached_response(etag: str) -> Optional[Response]:
+    """
+    Resposta pronta para um ETag já servido (corpo sem compressão); o
+    middleware troca pelo corpo comprimido que também está em cache
+    """
+    body = body_cache.get(etag, IDENTITY)
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+class _StreamCompressor:
+    """Compressão incremental para respostas sem Content-Length (StreamingResponse)"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=5)
+        else:
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(chunk)
+            return out + (self._compressor.finish() if final else self._compressor.flush())
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start: Optional[Message] = None
+        mode = "pass"
+        chunks = []
+        compressor: Optional[_StreamCompressor] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, mode, compressor
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                if (message["status"] in (204, 304) or "content-encoding" in headers
+                        or not _compressible(headers.get("content-type", ""))):
+                    mode = "pass"
+                elif "content-length" in headers:
+                    mode = "buffer"
+                else:
+                    mode = "stream" if encoding else "pass"
+                if mode == "pass":
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or mode == "pass":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if mode == "buffer":
+                chunks.append(body)
+                if not more_body:
+                    await self._send_buffered(start, b"".join(chunks), encoding, send)
+                return
+            if compressor is None:
+                compressor = _StreamCompressor(encoding)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                await send(start)
+            await send({"type": "http.response.body", "body": compressor.compress(body, not more_body), "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_buffered(self, start: Message, body: bytes, encoding: Optional[str], send: Send) -> None:
+        headers = MutableHeaders(raw=start["headers"])
+        if len(body) >= self.minimum_size:
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag") if start["status"] == 200 else None
+            if etag:
+                body_cache.put(etag, IDENTITY, body)
+            if encoding:
+                compressed = body_cache.get(etag, encoding) if etag else None
+                if compressed is None:
+                    compressed = compress(body, encoding, cached=bool(etag))
+                    if etag:
+                        body_cache.put(etag, encoding, compressed)
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                # A representação comprimida não é idêntica byte a byte: ETag fraco (_etag_matches aceita W/)
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 import os
 
@@ -12,6 +13,28 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def _async_database_url(url: str) -> str:
+	"""O mesmo banco pelo driver assíncrono: aiosqlite para SQLite, asyncpg para Postgres"""
+	if url.startswith("sqlite://"):
+		return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+	for prefix in ("postgres://", "postgresql://", "postgresql+psycopg2://"):
+		if url.startswith(prefix):
+			return "postgresql+asyncpg://" + url[len(prefix):]
+	return url
+
+
+# Usado pelos endpoints async (pedidos): consultas sem bloquear o event loop.
+# No SQLite as transações async concorrentes esperam o lock de escrita umas das
+# outras; o timeout padrão (5s) estoura numa rajada de pedidos
+async_engine = create_async_engine(
+	_async_database_url(DATABASE_URL),
+	connect_args={"timeout": 30} if DATABASE_URL.startswith("sqlite") else {},
+)
+
+# expire_on_commit=False: ler atributos depois do commit não pode disparar IO implícito no modo async
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
 class Base(DeclarativeBase):
 	pass
 
@@ -23,3 +46,7 @@ def get_db():
 	finally:
 		db.close()
 
+
+async def get_async_db():
+	async with AsyncSessionLocal() as db:
+		yield db
@@ -0,0 +1,108 @@
+"""
+Chaves de Idempotência - SwiftShop
+Retentativas com o mesmo header Idempotency-Key recebem a resposta guardada
+da primeira requisição em vez de repetir a escrita (pedido, estoque, emails)
+"""
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple
+import hashlib
+import json
+import os
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from backend.database import SessionLocal
+from backend.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+TTL = timedelta(hours=int(os.environ.get("IDEMPOTENCY_TTL_HOURS", 24)))
+# Uma chave pendente há mais tempo que isso é de uma requisição que morreu no meio
+PENDING_TIMEOUT = timedelta(seconds=int(os.environ.get("IDEMPOTENCY_PENDING_TIMEOUT", 60)))
+WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", 30))
+POLL_INTERVAL = 0.1
+MAX_KEY_LENGTH = 255
+
+
+def request_hash(*parts: Any) -> str:
+    """Hash do conteúdo da requisição: a mesma chave com outro corpo é erro do cliente"""
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def acquire(user_id: int, endpoint: str, key: str, req_hash: str) -> Optional[Tuple[int, str]]:
+    """
+    Reserva a chave para esta requisição. Devolve None quando quem chamou deve
+    executar a escrita (e depois chamar complete ou release), ou (status, corpo)
+    da resposta já guardada. Uma requisição concorrente com a mesma chave espera
+    a primeira terminar, consultando o banco (funciona entre workers).
+    Bloqueante: em endpoints async, chamar via run_in_threadpool
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{HEADER} inválida")
+    deadline = time.monotonic() + WAIT_SECONDS
+    while True:
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now))
+            db.add(IdempotencyKey(
+                user_id=user_id, endpoint=endpoint, key=key, request_hash=req_hash,
+                created_at=now, expires_at=now + TTL,
+            ))
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+            record = (
+                db.query(IdempotencyKey)
+                .filter(IdempotencyKey.user_id == user_id, IdempotencyKey.endpoint == endpoint, IdempotencyKey.key == key)
+                .first()
+            )
+            if record is None:
+                # Removida entre o INSERT e a leitura (release ou expiração): tenta de novo
+                continue
+            if record.request_hash != req_hash:
+                raise HTTPException(status_code=422, detail=f"{HEADER} já usada com outra requisição")
+            if record.response_status is not None:
+                return record.response_status, record.response_body
+            if record.created_at < now - PENDING_TIMEOUT:
+                db.delete(record)
+                db.commit()
+                continue
+        finally:
+            db.close()
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="Requisição com esta Idempotency-Key ainda em processamento")
+        time.sleep(POLL_INTERVAL)
+
+
+def complete(user_id: int, endpoint: str, key: str, status_code: int, body: str) -> None:
+    """Guarda a resposta da requisição que executou a escrita"""
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.endpoint == endpoint, IdempotencyKey.key == key,
+        ).update({"response_status": status_code, "response_body": body}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def release(user_id: int, endpoint: str, key: str) -> None:
+    """
+    Libera a chave quando a escrita falhou (nada foi gravado): a retentativa
+    executa de novo em vez de receber o erro
+    """
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.endpoint == endpoint, IdempotencyKey.key == key,
+            IdempotencyKey.response_status.is_(None),
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
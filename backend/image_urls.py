@@ -0,0 +1,94 @@
+"""
+URLs públicas de imagens - SwiftShop
+No banco ficam chaves canônicas (/uploads/<arquivo>); nas respostas elas
+recebem um prefixo calculado uma única vez na inicialização
+"""
+from typing import List, Optional
+from urllib.parse import urlsplit
+import ipaddress
+import os
+
+PRODUCTION_URL = 'https://swiftshop-backend-a4px.onrender.com'
+
+
+# URL base da API - sempre usa a URL de produção quando disponível
+def get_base_url() -> str:
+    """Retorna a URL base da API, priorizando produção"""
+    # Verifica se está rodando no Render (produção)
+    render_url = os.environ.get('RENDER_EXTERNAL_URL')
+    if render_url:
+        return render_url.rstrip('/')
+    # URL de produção hardcoded como fallback
+    return PRODUCTION_URL
+
+
+# IMAGE_CDN_BASE (opcional) deve servir os mesmos caminhos /uploads/... da API
+PUBLIC_URL_PREFIX = os.environ.get('IMAGE_CDN_BASE', '').rstrip('/') or get_base_url()
+
+
+def _host(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+
+# Hosts que servem os arquivos desta API: produção, Render e CDN configurado
+_OWN_HOSTS = {_host(u) for u in (PUBLIC_URL_PREFIX, PRODUCTION_URL, get_base_url()) if u}
+
+
+def is_local_image_url(url: str) -> bool:
+    """
+    URL absoluta servida por esta API (domínio próprio, localhost ou IP da rede
+    local, gravados por versões antigas do app); URLs de terceiros dão False
+    """
+    host = _host(url)
+    if not host:
+        return False
+    if host in _OWN_HOSTS or host == 'localhost':
+        return True
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return ip.is_private or ip.is_loopback
+
+
+def canonical_image_path(url: Optional[str]) -> Optional[str]:
+    """
+    Reduz uma URL de imagem à chave guardada no banco: URLs desta API (IP da
+    rede local, localhost, domínio de produção) viram /uploads/<arquivo>;
+    URLs de outros hosts ficam como estão, mesmo que tenham /uploads/ no caminho
+    """
+    if not url:
+        return url
+    if url.startswith('http://') or url.startswith('https://'):
+        if not is_local_image_url(url):
+            return url
+        if '/uploads/' in url:
+            return '/uploads/' + url.split('/uploads/')[-1]
+        # Outros caminhos só perdem o host quando é o domínio da própria API
+        path = urlsplit(url).path
+        return path if path and _host(url) in _OWN_HOSTS else url
+    return url if url.startswith('/') else '/' + url
+
+
+def canonical_image_paths(urls: Optional[List[str]]) -> Optional[List[str]]:
+    if urls is None:
+        return None
+    return [canonical_image_path(url) for url in urls if url]
+
+
+def normalize_image_url(url: str) -> str:
+    """Converte a chave guardada no banco na URL pública"""
+    if not url:
+        return url
+    if url[0] == '/':
+        return PUBLIC_URL_PREFIX + url
+    if url.startswith('http://') or url.startswith('https://'):
+        return url
+    return f"{PUBLIC_URL_PREFIX}/{url}"
+
+
+def normalize_image_urls(urls: Optional[List[str]]) -> Optional[List[str]]:
+    """Normaliza um array de URLs de imagens"""
+    if not urls:
+        return urls
+    return [normalize_image_url(url) for url in urls if url]
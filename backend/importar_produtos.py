@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Script para importar produtos em lote (CSV ou NDJSON), com upsert por sku
+Uso: python -m backend.importar_produtos catalogo.csv [--format csv|ndjson] [--batch-size 1000]
+"""
+
+import argparse
+import time
+
+from backend.database import SessionLocal
+from backend.main import import_products, read_import_records, IMPORT_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa produtos de um arquivo CSV ou NDJSON")
+    parser.add_argument("arquivo")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.arquivo.lower().endswith(".csv") else "ndjson")
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        with open(args.arquivo, encoding="utf-8-sig", newline="") as stream:
+            result = import_products(db, read_import_records(stream, fmt), batch_size=args.batch_size)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+
+    total = result.created + result.updated
+    print(f"✅ {result.created} criados, {result.updated} atualizados em {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} linhas/s)")
+    if result.errors:
+        print(f"❌ {len(result.errors)} linhas com erro:")
+        for error in result.errors[:50]:
+            print(f"  linha {error.row} (sku={error.sku}): {'; '.join(error.errors)}")
+        if len(result.errors) > 50:
+            print(f"  ... e mais {len(result.errors) - 50}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,48 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from typing import List, Optional, Dict
+from sqlalchemy.orm import Session, load_only, noload, selectinload
+from sqlalchemy import func, text, tuple_, or_, and_, case, literal, update, select, bindparam, literal_column
+from typing import List, Optional, Dict, Union, Any, Iterable, Iterator, Tuple
 import base64
+import hashlib
 import requests
-import unicodedata
 import json
 import os
 import uuid
 import asyncio
+import csv
+import io
+import threading
 from datetime import datetime
 
-from backend.database import Base, engine, get_db, SessionLocal
-from backend.models import User, Product, Order, OrderItem, UserRole, OrderStatus, Favorite, Review, Message
-from backend.schemas import UserCreate, UserLogin, UserUpdate, UserOut, Token, ProductCreate, ProductUpdate, ProductOut, OrderCreate, OrderOut, sanitize_attributes, ReviewCreate, ReviewOut, ReviewWithUserOut, MessageCreate, MessageOut
+from backend.database import Base, engine, get_db, SessionLocal, get_async_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.models import User, Product, ProductVariant, ProductAttribute, AppCounter, CatalogChange, Order, OrderItem, DailySales, DailyProductSales, DailyVisits, UserRole, OrderStatus, Favorite, Review, Message
+from backend.schemas import UserCreate, UserLogin, UserUpdate, UserOut, Token, ProductCreate, ProductUpdate, ProductOut, ProductCard, ProductPage, ProductBatch, ProductImportResult, ProductImportError, OrderCreate, OrderOut, OrderPage, sanitize_attributes, fold_text, attribute_pairs, FACET_ATTRS, FacetValue, ProductFacets, ReviewCreate, ReviewOut, ReviewWithUserOut, MessageCreate, MessageOut
 from backend.auth import get_password_hash, verify_password, create_access_token, get_current_user, require_admin, SECRET_KEY, ALGORITHM
 from jose import jwt
+from pydantic import ValidationError
 from backend import email_service
 from backend import receipt_service
+from backend import search_service
+from backend import catalog_snapshot
+from backend import idempotency
+from backend import sales_rollup
+from backend.product_cache import product_cache
+from backend.report_cache import report_cache
+from backend.compression import CompressionMiddleware, body_cache, cached_response
+from backend.visit_tracker import VisitTrackingMiddleware, visit_buffer, CATALOG
 from backend.timezone_utils import now_moz
-from fastapi.responses import FileResponse
+from backend.image_urls import normalize_image_url, normalize_image_urls, canonical_image_path, canonical_image_paths, PUBLIC_URL_PREFIX
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 
 Base.metadata.create_all(bind=engine)
 
+# Taxa de envio fixa, gravada em cada pedido no momento da criação
+SHIPPING_COST = 50.0
+
 def _ensure_user_columns():
     try:
         with engine.connect() as conn:
@@ -59,12 +77,275 @@ def _ensure_product_columns():
                 conn.execute(text("ALTER TABLE products ADD COLUMN size_colors_json TEXT"))
             if 'size_stock_json' not in cols:
                 conn.execute(text("ALTER TABLE products ADD COLUMN size_stock_json TEXT"))
+            if 'main_category_norm' not in cols:
+                conn.execute(text("ALTER TABLE products ADD COLUMN main_category_norm TEXT"))
+            if 'sub_category_norm' not in cols:
+                conn.execute(text("ALTER TABLE products ADD COLUMN sub_category_norm TEXT"))
+            if 'version' not in cols:
+                conn.execute(text("ALTER TABLE products ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+            if 'rating_avg' not in cols:
+                conn.execute(text("ALTER TABLE products ADD COLUMN rating_avg FLOAT NOT NULL DEFAULT 0"))
+            if 'rating_count' not in cols:
+                conn.execute(text("ALTER TABLE products ADD COLUMN rating_count INTEGER NOT NULL DEFAULT 0"))
+            if 'sku' not in cols:
+                conn.execute(text("ALTER TABLE products ADD COLUMN sku VARCHAR(80)"))
     except Exception:
    
         pass
 
+def _ensure_order_columns():
+    try:
+        with engine.connect() as conn:
+            cols = set(row[1] for row in conn.execute(text("PRAGMA table_info(orders)")))
+            for col, coltype in (("subtotal", "FLOAT"), ("shipping_cost", "FLOAT"), ("total", "FLOAT"), ("item_count", "INTEGER")):
+                if col not in cols:
+                    conn.execute(text(f"ALTER TABLE orders ADD COLUMN {col} {coltype} NOT NULL DEFAULT 0"))
+    except Exception:
+        pass
+
+def _ensure_order_item_columns():
+    try:
+        with engine.connect() as conn:
+            cols = set(row[1] for row in conn.execute(text("PRAGMA table_info(order_items)")))
+            for col in ("size", "color"):
+                if col not in cols:
+                    conn.execute(text(f"ALTER TABLE order_items ADD COLUMN {col} VARCHAR(40)"))
+    except Exception:
+        pass
+
+def _ensure_indexes():
+    # create_all não cria índices novos em tabelas que já existem
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception:
+                pass
+
+def _backfill_category_norms():
+    # Preenche as colunas normalizadas de produtos gravados antes delas existirem
+    try:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, main_category, sub_category FROM products "
+                "WHERE (main_category IS NOT NULL AND main_category_norm IS NULL) "
+                "OR (sub_category IS NOT NULL AND sub_category_norm IS NULL)"
+            )).all()
+            if rows:
+                conn.execute(
+                    text("UPDATE products SET main_category_norm = :mc, sub_category_norm = :sc WHERE id = :id"),
+                    [{"id": r.id, "mc": fold_text(r.main_category), "sc": fold_text(r.sub_category)} for r in rows],
+                )
+    except Exception:
+        pass
+
+def _legacy_size_maps(images_raw: Optional[str], colors_raw: Optional[str], stock_raw: Optional[str]):
+    """Lê os JSON antigos por tamanho, aceitando string única ou lista em fotos e cores"""
+    def _load(raw):
+        if not raw:
+            return None
+        try:
+            value = json.loads(raw)
+        except Exception:
+            return None
+        return value if isinstance(value, dict) else None
+
+    size_images = _load(images_raw)
+    if size_images is not None:
+        size_images = {
+            size: value if isinstance(value, list) else [value]
+            for size, value in size_images.items() if isinstance(value, (list, str))
+        }
+    size_colors = _load(colors_raw)
+    if size_colors is not None:
+        size_colors = {
+            size: colors if isinstance(colors, list) else ([colors] if isinstance(colors, str) else [])
+            for size, colors in size_colors.items()
+        }
+    size_stock = _load(stock_raw)
+    return size_images, size_colors, size_stock
+
+
+def _variant_rows(size_images: Optional[dict], size_colors: Optional[dict], size_stock: Optional[dict]) -> List[dict]:
+    """Uma linha por tamanho presente em qualquer um dos mapas, na ordem em que aparecem"""
+    sizes: Dict[str, None] = {}
+    for mapping in (size_stock, size_colors, size_images):
+        for size in (mapping or {}):
+            sizes[str(size)] = None
+    rows = []
+    for size in sizes:
+        stock = None
+        if size_stock is not None and size in size_stock:
+            try:
+                stock = int(size_stock[size])
+            except (TypeError, ValueError):
+                stock = 0
+        rows.append({
+            "size": size,
+            "colors_json": json.dumps(size_colors[size]) if size_colors is not None and size in size_colors else None,
+            "stock": stock,
+            "image_urls_json": json.dumps(size_images[size]) if size_images is not None and size in size_images else None,
+        })
+    return rows
+
+
+def _migrate_size_json_to_variants():
+    # Migração única: size_*_json -> product_variants; os JSON antigos são zerados depois de copiados
+    try:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, size_images_json, size_colors_json, size_stock_json FROM products "
+                "WHERE size_images_json IS NOT NULL OR size_colors_json IS NOT NULL OR size_stock_json IS NOT NULL"
+            )).all()
+            for r in rows:
+                variants = _variant_rows(*_legacy_size_maps(r.size_images_json, r.size_colors_json, r.size_stock_json))
+                conn.execute(text("DELETE FROM product_variants WHERE product_id = :id"), {"id": r.id})
+                if variants:
+                    conn.execute(
+                        text("INSERT INTO product_variants (product_id, size, colors_json, stock, image_urls_json) "
+                             "VALUES (:product_id, :size, :colors_json, :stock, :image_urls_json)"),
+                        [{"product_id": r.id, **v} for v in variants],
+                    )
+                conn.execute(text(
+                    "UPDATE products SET size_images_json = NULL, size_colors_json = NULL, size_stock_json = NULL, "
+                    "version = version + 1 WHERE id = :id"
+                ), {"id": r.id})
+    except Exception:
+        pass
+
+CATALOG_COUNTER = "catalog"
+
+
+def _init_catalog_version():
+    # Incrementa a cada inicialização: um deploy pode mudar o formato das respostas
+    try:
+        with engine.begin() as conn:
+            updated = conn.execute(
+                update(AppCounter).where(AppCounter.key == CATALOG_COUNTER).values(value=AppCounter.value + 1)
+            ).rowcount
+            if not updated:
+                conn.execute(AppCounter.__table__.insert().values(key=CATALOG_COUNTER, value=1))
+    except Exception:
+        pass
+
+def _backfill_product_attributes():
+    # Popula product_attributes para produtos gravados antes da tabela existir
+    try:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, attributes_json FROM products WHERE attributes_json IS NOT NULL "
+                "AND id NOT IN (SELECT product_id FROM product_attributes)"
+            )).all()
+            values = []
+            for r in rows:
+                try:
+                    attrs = json.loads(r.attributes_json)
+                except Exception:
+                    continue
+                if isinstance(attrs, dict):
+                    values.extend(
+                        {"product_id": r.id, "key": k, "value": v, "value_norm": n}
+                        for k, v, n in attribute_pairs(attrs)
+                    )
+            if values:
+                conn.execute(
+                    text("INSERT INTO product_attributes (product_id, key, value, value_norm) "
+                         "VALUES (:product_id, :key, :value, :value_norm)"),
+                    values,
+                )
+    except Exception:
+        pass
+
+def _backfill_order_totals():
+    # Pedidos gravados antes das colunas de totais: soma os itens uma única vez
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE orders SET "
+                "subtotal = (SELECT COALESCE(SUM(unit_price * quantity), 0) FROM order_items WHERE order_items.order_id = orders.id), "
+                "item_count = (SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE order_items.order_id = orders.id), "
+                "shipping_cost = :shipping "
+                "WHERE item_count = 0 AND id IN (SELECT order_id FROM order_items)"
+            ), {"shipping": SHIPPING_COST})
+            conn.execute(text("UPDATE orders SET total = subtotal + shipping_cost WHERE total = 0 AND item_count > 0"))
+    except Exception:
+        pass
+
+def _init_sales_rollups():
+    # Primeira inicialização com as tabelas de resumo: monta a partir do histórico de pedidos
+    marker = "migration_sales_rollups"
+    try:
+        with SessionLocal() as db:
+            if db.query(AppCounter.value).filter(AppCounter.key == marker).scalar():
+                return
+            db.add(AppCounter(key=marker, value=1))
+            sales_rollup.rebuild(db)
+    except Exception:
+        pass
+
+def _backfill_product_ratings():
+    # Calcula rating_avg/rating_count de produtos avaliados antes das colunas existirem
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE products SET "
+                "rating_avg = (SELECT AVG(rating) FROM reviews WHERE reviews.product_id = products.id), "
+                "rating_count = (SELECT COUNT(*) FROM reviews WHERE reviews.product_id = products.id) "
+                "WHERE rating_count = 0 AND id IN (SELECT product_id FROM reviews)"
+            ))
+    except Exception:
+        pass
+
+def _migrate_canonical_image_urls():
+    # Migração única: URLs absolutas gravadas (IPs da rede local, domínio de produção) -> /uploads/<arquivo>.
+    # canonical_image_path não mexe em URLs de outros hosts, então imagens de CDNs externas ficam intactas
+    marker = "migration_canonical_image_urls"
+
+    def _canonical_list(raw):
+        try:
+            urls = json.loads(raw)
+        except Exception:
+            return raw
+        return json.dumps(canonical_image_paths(urls)) if isinstance(urls, list) else raw
+
+    try:
+        with engine.begin() as conn:
+            if conn.execute(select(AppCounter.value).where(AppCounter.key == marker)).scalar():
+                return
+            for r in conn.execute(text("SELECT id, image_url, image_urls_json FROM products")).all():
+                image_url = canonical_image_path(r.image_url)
+                image_urls_json = _canonical_list(r.image_urls_json) if r.image_urls_json else r.image_urls_json
+                if (image_url, image_urls_json) != (r.image_url, r.image_urls_json):
+                    conn.execute(text(
+                        "UPDATE products SET image_url = :u, image_urls_json = :l, version = version + 1 WHERE id = :id"
+                    ), {"u": image_url, "l": image_urls_json, "id": r.id})
+            for r in conn.execute(text("SELECT id, product_id, image_urls_json FROM product_variants WHERE image_urls_json IS NOT NULL")).all():
+                image_urls_json = _canonical_list(r.image_urls_json)
+                if image_urls_json != r.image_urls_json:
+                    conn.execute(text("UPDATE product_variants SET image_urls_json = :l WHERE id = :id"), {"l": image_urls_json, "id": r.id})
+                    conn.execute(text("UPDATE products SET version = version + 1 WHERE id = :id"), {"id": r.product_id})
+            for r in conn.execute(text("SELECT id, avatar_url FROM users WHERE avatar_url IS NOT NULL")).all():
+                avatar_url = canonical_image_path(r.avatar_url)
+                if avatar_url != r.avatar_url:
+                    conn.execute(text("UPDATE users SET avatar_url = :u WHERE id = :id"), {"u": avatar_url, "id": r.id})
+            conn.execute(AppCounter.__table__.insert().values(key=marker, value=1))
+    except Exception:
+        pass
+
 _ensure_user_columns()
 _ensure_product_columns()
+_ensure_order_columns()
+_ensure_order_item_columns()
+_migrate_size_json_to_variants()
+_migrate_canonical_image_urls()
+_backfill_category_norms()
+_backfill_product_attributes()
+_backfill_product_ratings()
+_backfill_order_totals()
+_init_sales_rollups()
+_ensure_indexes()
+_init_catalog_version()
+search_service.setup(engine)
 
 # Ensure reviews/messages tables exist
 try:
@@ -111,8 +392,12 @@ def paypal_create_order(total_value: float):
         raise HTTPException(status_code=500, detail="Falha ao criar ordem no PayPal")
     return res.json()
 
-@app.post("/payments/paypal/capture/{order_id}")
-def paypal_capture_order(order_id: str):
+def _replayed_response(stored) -> Response:
+    """Resposta guardada de uma requisição anterior com a mesma Idempotency-Key"""
+    status_code, body = stored
+    return Response(content=body, status_code=status_code, media_type="application/json", headers={"Idempotent-Replayed": "true"})
+
+def _paypal_capture(order_id: str) -> dict:
     token = _paypal_get_access_token()
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     res = requests.post(f"{PAYPAL_BASE}/v2/checkout/orders/{order_id}/capture", headers=headers, timeout=20)
@@ -120,6 +405,24 @@ def paypal_capture_order(order_id: str):
         raise HTTPException(status_code=500, detail="Falha ao capturar ordem no PayPal")
     return res.json()
 
+@app.post("/payments/paypal/capture/{order_id}")
+def paypal_capture_order(order_id: str, request: Request):
+    key = request.headers.get(idempotency.HEADER)
+    if not key:
+        return _paypal_capture(order_id)
+    # Endpoint sem login: chaves no escopo do usuário 0
+    scope = (0, "POST /payments/paypal/capture", key)
+    stored = idempotency.acquire(*scope, idempotency.request_hash(order_id))
+    if stored is not None:
+        return _replayed_response(stored)
+    try:
+        result = _paypal_capture(order_id)
+    except Exception:
+        idempotency.release(*scope)
+        raise
+    idempotency.complete(*scope, 200, json.dumps(result))
+    return result
+
 app.add_middleware(
 	CORSMiddleware,
 	allow_origins=["*"],
@@ -127,60 +430,14 @@ app.add_middleware(
 	allow_methods=["*"],
 	allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(VisitTrackingMiddleware)
 
 # Static files for uploads
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
-# URL base da API - sempre usa a URL de produção quando disponível
-def get_base_url() -> str:
-	"""Retorna a URL base da API, priorizando produção"""
-	# Verifica se está rodando no Render (produção)
-	render_url = os.environ.get('RENDER_EXTERNAL_URL')
-	if render_url:
-		return render_url.rstrip('/')
-	
-	# URL de produção hardcoded como fallback
-	production_url = 'https://swiftshop-backend-a4px.onrender.com'
-	return production_url
-
-def normalize_image_url(url: str) -> str:
-	"""Converte URL de imagem para usar a URL de produção"""
-	if not url:
-		return url
-	
-	# Se já é uma URL completa com domínio de produção, retorna
-	if url.startswith('https://swiftshop-backend-a4px.onrender.com'):
-		return url
-	
-	# Se é URL relativa (começa com /), adiciona base URL de produção
-	if url.startswith('/'):
-		return f"{get_base_url()}{url}"
-	
-	# Se contém IP local (172.16.x.x ou 192.168.x.x ou 127.0.0.1), substitui pela URL de produção
-	if '://172.16.' in url or '://192.168.' in url or '://127.0.0.1' in url or '://localhost' in url:
-		# Extrai o caminho após o domínio/IP
-		if '/uploads/' in url:
-			path = '/uploads/' + url.split('/uploads/')[-1]
-			return f"{get_base_url()}{path}"
-		elif '/uploads' in url:
-			path = url.split('/uploads')[1]
-			return f"{get_base_url()}/uploads{path}"
-	
-	# Se já é URL completa (http/https), retorna como está
-	if url.startswith('http://') or url.startswith('https://'):
-		return url
-	
-	# Caso padrão: assume que é relativa
-	return f"{get_base_url()}/{url}"
-
-def normalize_image_urls(urls: Optional[List[str]]) -> Optional[List[str]]:
-	"""Normaliza um array de URLs de imagens"""
-	if not urls:
-		return urls
-	return [normalize_image_url(url) for url in urls if url]
-
 # Rota raiz - informações da API
 @app.get("/")
 def root():
@@ -200,7 +457,170 @@ def root():
 	}
 
 
+def _variant_maps(p: Product):
+	"""Reconstrói size_images / size_colors / size_stock a partir das variantes já carregadas"""
+	size_images: Optional[Dict[str, List[str]]] = None
+	size_colors: Optional[Dict[str, List[str]]] = None
+	size_stock: Optional[Dict[str, int]] = None
+	for v in p.variants:
+		if v.image_urls_json is not None:
+			size_images = size_images if size_images is not None else {}
+			size_images[v.size] = json.loads(v.image_urls_json)
+		if v.colors_json is not None:
+			size_colors = size_colors if size_colors is not None else {}
+			size_colors[v.size] = json.loads(v.colors_json)
+		if v.stock is not None:
+			size_stock = size_stock if size_stock is not None else {}
+			size_stock[v.size] = v.stock
+	return size_images, size_colors, size_stock
+
+
+def _set_variants(product: Product, size_images: Optional[dict], size_colors: Optional[dict], size_stock: Optional[dict]) -> None:
+	"""Sincroniza product.variants com os mapas por tamanho, atualizando as linhas existentes no lugar"""
+	existing = {v.size: v for v in product.variants}
+	variants = []
+	if size_images:
+		size_images = {size: canonical_image_paths(urls) for size, urls in size_images.items()}
+	for row in _variant_rows(size_images, size_colors, size_stock):
+		variant = existing.get(row["size"]) or ProductVariant(size=row["size"])
+		variant.colors_json = row["colors_json"]
+		variant.stock = row["stock"]
+		variant.image_urls_json = row["image_urls_json"]
+		variants.append(variant)
+	product.variants = variants
+
+
+def _normalize_sku(sku: Optional[str]) -> Optional[str]:
+	sku = (sku or "").strip()
+	return sku or None
+
+
+def _sku_taken(db: Session, sku: Optional[str], product_id: Optional[int] = None) -> bool:
+	if not sku:
+		return False
+	query = db.query(Product.id).filter(Product.sku == sku)
+	if product_id is not None:
+		query = query.filter(Product.id != product_id)
+	return query.first() is not None
+
+
+def _set_attributes(product: Product, attrs: Optional[Dict[str, Any]]) -> None:
+	"""Grava attributes_json e as linhas indexadas de product_attributes a partir dos atributos sanitizados"""
+	product.attributes_json = json.dumps(attrs) if attrs else None
+	product.attribute_rows = [
+		ProductAttribute(key=k, value=v, value_norm=n) for k, v, n in attribute_pairs(attrs)
+	]
+
+
 def _product_to_out(p: Product) -> ProductOut:
+	"""Serializa o produto, reaproveitando o payload em cache enquanto a versão da linha não mudar"""
+	cached = product_cache.get(p.id, p.version)
+	if cached is not None:
+		return cached
+	out = _build_product_out(p)
+	product_cache.put(p.id, p.version, out)
+	return out
+
+
+PRODUCT_FIELDS = tuple(ProductOut.model_fields)
+_VARIANT_FIELDS = {'size_images', 'size_colors', 'size_stock'}
+# Colunas necessárias para cada campo de ProductOut (os de variantes vêm do relacionamento)
+_FIELD_COLUMNS = {
+	'id': (Product.id,),
+	'name': (Product.name,),
+	'price': (Product.price,),
+	'description': (Product.description,),
+	'image_url': (Product.image_url,),
+	'image_urls': (Product.image_urls_json,),
+	'category': (Product.category,),
+	'stock': (Product.stock,),
+	'main_category': (Product.main_category,),
+	'sub_category': (Product.sub_category,),
+	'attributes': (Product.attributes_json,),
+	'sku': (Product.sku,),
+}
+_CARD_COLUMNS = (Product.id, Product.name, Product.price, Product.image_url, Product.image_urls_json, Product.stock)
+
+
+def _parse_product_view(view: str, fields: str) -> Optional[List[str]]:
+	"""Valida view/fields; devolve a lista de campos pedida (None = view completa ou card)"""
+	if view not in ("full", "card"):
+		raise HTTPException(status_code=400, detail="view deve ser 'full' ou 'card'")
+	if not fields:
+		return None
+	requested = ['id'] + [f.strip() for f in fields.split(',') if f.strip() and f.strip() != 'id']
+	invalid = [f for f in requested if f not in PRODUCT_FIELDS]
+	if invalid:
+		raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalid)}")
+	return list(dict.fromkeys(requested))
+
+
+def _product_load_options(view: str, fields: Optional[List[str]], extra_columns: tuple = ()) -> list:
+	"""load_only das colunas usadas pela projeção; variantes só são carregadas se pedidas"""
+	if fields is None and view == "full":
+		return []
+	if fields is None:
+		return [load_only(*_CARD_COLUMNS, *extra_columns), noload(Product.variants)]
+	columns = [Product.id, Product.name, *extra_columns]
+	for f in fields:
+		columns.extend(_FIELD_COLUMNS.get(f, ()))
+	variants = selectinload(Product.variants) if _VARIANT_FIELDS.intersection(fields) else noload(Product.variants)
+	return [load_only(*columns), variants]
+
+
+def _first_image(p: Product) -> Optional[str]:
+	if p.image_urls_json:
+		try:
+			urls = json.loads(p.image_urls_json)
+			if urls:
+				return normalize_image_url(urls[0])
+		except Exception:
+			pass
+	return normalize_image_url(p.image_url) if p.image_url else None
+
+
+def _product_to_card(p: Product) -> ProductCard:
+	return ProductCard(id=p.id, name=p.name, price=p.price, image_url=_first_image(p), stock=p.stock)
+
+
+def _product_to_fields(p: Product, fields: List[str]) -> Dict[str, Any]:
+	"""Monta só os campos pedidos; colunas JSON não pedidas não são lidas nem parseadas"""
+	out: Dict[str, Any] = {}
+	variant_maps = _variant_maps(p) if _VARIANT_FIELDS.intersection(fields) else None
+	for f in fields:
+		if f == 'image_url':
+			out[f] = normalize_image_url(p.image_url) if p.image_url else None
+		elif f == 'image_urls':
+			try:
+				out[f] = normalize_image_urls(json.loads(p.image_urls_json)) if p.image_urls_json else None
+			except Exception:
+				out[f] = None
+		elif f == 'attributes':
+			try:
+				out[f] = json.loads(p.attributes_json) if p.attributes_json else None
+			except Exception:
+				out[f] = None
+		elif f == 'size_images':
+			images = variant_maps[0]
+			out[f] = {size: normalize_image_urls(urls) for size, urls in images.items()} if images else None
+		elif f == 'size_colors':
+			out[f] = variant_maps[1]
+		elif f == 'size_stock':
+			out[f] = variant_maps[2]
+		else:
+			out[f] = getattr(p, f)
+	return out
+
+
+def _serialize_product(p: Product, view: str = "full", fields: Optional[List[str]] = None):
+	if fields is not None:
+		return _product_to_fields(p, fields)
+	if view == "card":
+		return _product_to_card(p)
+	return _product_to_out(p)
+
+
+def _build_product_out(p: Product) -> ProductOut:
 	attrs: Optional[dict] = None
 	if p.attributes_json:
 		try:
@@ -216,55 +636,7 @@ def _product_to_out(p: Product) -> ProductOut:
 		except Exception:
 			image_urls = None
 	
-	# Parse size_images from JSON - handle both old format (string) and new format (array)
-	size_images: Optional[Dict[str, List[str]]] = None
-	if p.size_images_json:
-		try:
-			raw_size_images = json.loads(p.size_images_json)
-			# Handle migration from old format (Dict[str, str]) to new format (Dict[str, List[str]])
-			if isinstance(raw_size_images, dict):
-				size_images = {}
-				for size, value in raw_size_images.items():
-					if isinstance(value, list):
-						# New format - already a list
-						size_images[size] = value
-					elif isinstance(value, str):
-						# Old format - convert single string to list
-						size_images[size] = [value]
-			else:
-				size_images = None
-		except Exception:
-			size_images = None
-	
-	# Parse size_colors from JSON
-	size_colors: Optional[Dict[str, List[str]]] = None
-	if p.size_colors_json:
-		try:
-			raw_size_colors = json.loads(p.size_colors_json)
-			# Migração: converter strings únicas para arrays
-			if isinstance(raw_size_colors, dict):
-				size_colors = {}
-				for size, colors in raw_size_colors.items():
-					if isinstance(colors, str):
-						# Formato antigo: string única -> converter para array
-						size_colors[size] = [colors]
-					elif isinstance(colors, list):
-						# Formato novo: já é array
-						size_colors[size] = colors
-					else:
-						size_colors[size] = []
-			else:
-				size_colors = None
-		except Exception:
-			size_colors = None
-	
-	# Parse size_stock from JSON
-	size_stock: Optional[Dict[str, int]] = None
-	if p.size_stock_json:
-		try:
-			size_stock = json.loads(p.size_stock_json)
-		except Exception:
-			size_stock = None
+	size_images, size_colors, size_stock = _variant_maps(p)
 	
 	# Normalizar URLs de imagens para usar URL de produção
 	normalized_image_url = normalize_image_url(p.image_url) if p.image_url else None
@@ -292,9 +664,109 @@ def _product_to_out(p: Product) -> ProductOut:
 		main_category=p.main_category,
 		sub_category=p.sub_category,
 		attributes=attrs,
+		sku=p.sku,
 	)
 
 
+# Versões do catálogo mantidas em catalog_changes; um worker mais atrasado que isso recarrega tudo
+CATALOG_CHANGES_KEEP = 1000
+
+
+def _bump_catalog_version(db: Session, product_ids: Iterable[int] = ()) -> None:
+	"""
+	Invalida os ETags do catálogo; chamar na mesma transação da escrita, com os produtos
+	criados/alterados/removidos. Em CATALOG_SNAPSHOT=shared eles vão para catalog_changes,
+	para os outros workers aplicarem só essas mudanças ao snapshot
+	"""
+	db.execute(update(AppCounter).where(AppCounter.key == CATALOG_COUNTER).values(value=AppCounter.value + 1))
+	ids = list(dict.fromkeys(product_ids))
+	if catalog_snapshot.MODE != "shared" or not ids:
+		return
+	version = _catalog_version(db)
+	db.execute(CatalogChange.__table__.insert(), [{"version": version, "product_id": i} for i in ids])
+	db.execute(CatalogChange.__table__.delete().where(CatalogChange.version <= version - CATALOG_CHANGES_KEEP))
+
+
+def _catalog_version(db: Session) -> int:
+	return db.query(AppCounter.value).filter(AppCounter.key == CATALOG_COUNTER).scalar() or 0
+
+
+def _snapshot_entry(p: Product) -> catalog_snapshot.SnapshotEntry:
+	return catalog_snapshot.SnapshotEntry(
+		id=p.id,
+		version=p.version,
+		name=p.name,
+		price=p.price,
+		stock=p.stock,
+		rating_avg=p.rating_avg or 0,
+		main_category_norm=p.main_category_norm,
+		sub_category_norm=p.sub_category_norm,
+		out=_build_product_out(p),
+		card=_product_to_card(p),
+	)
+
+
+def _load_catalog_snapshot():
+	"""(versão, entradas) para um snapshot completo, lidos numa sessão própria"""
+	db = SessionLocal()
+	try:
+		version = _catalog_version(db)
+		return version, [_snapshot_entry(p) for p in db.query(Product).yield_per(1000)]
+	finally:
+		db.close()
+
+
+def _load_catalog_changes(since: int):
+	"""(versão, entradas alteradas, ids removidos) desde since; None se catalog_changes não cobre todas as versões"""
+	db = SessionLocal()
+	try:
+		version = _catalog_version(db)
+		rows = db.query(CatalogChange.version, CatalogChange.product_id).filter(
+			CatalogChange.version > since, CatalogChange.version <= version,
+		).all()
+		if {v for v, _ in rows} != set(range(since + 1, version + 1)):
+			return None
+		ids = {product_id for _, product_id in rows}
+		products = db.query(Product).filter(Product.id.in_(ids)).all() if ids else []
+		return version, [_snapshot_entry(p) for p in products], ids - {p.id for p in products}
+	finally:
+		db.close()
+
+
+def _current_snapshot(db: Session) -> Optional[catalog_snapshot.CatalogSnapshot]:
+	return catalog_snapshot.get(lambda: _catalog_version(db), _load_catalog_snapshot, _load_catalog_changes)
+
+
+def _sync_snapshot(db: Session, product_ids: Iterable[int] = (), removed: Iterable[int] = ()) -> None:
+	"""Depois do commit: aplica as mudanças destes produtos ao snapshot do catálogo (se ativo)"""
+	if not catalog_snapshot.enabled:
+		return
+	ids = list(dict.fromkeys(product_ids))
+	products = db.query(Product).filter(Product.id.in_(ids)).all() if ids else []
+	_apply_to_snapshot(_catalog_version(db), products, removed)
+
+
+def _apply_to_snapshot(version: int, products: List[Product], removed: Iterable[int] = ()) -> None:
+	"""Serializa os produtos já carregados (com as variantes) e publica no snapshot; não consulta o banco"""
+	catalog_snapshot.apply(version, [_snapshot_entry(p) for p in products], removed)
+
+
+# Entra no ETag do produto: trocar o prefixo das imagens (ex: IMAGE_CDN_BASE) muda as respostas sem mudar a versão da linha
+_URL_PREFIX_TAG = hashlib.sha1(PUBLIC_URL_PREFIX.encode('utf-8')).hexdigest()[:8]
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+	header = request.headers.get("if-none-match")
+	if not header:
+		return False
+	candidates = [c.strip() for c in header.split(",")]
+	return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _not_modified(etag: str) -> Response:
+	return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
 # Upload endpoint
 @app.post("/upload")
 def upload_image(file: UploadFile = File(...)):
@@ -319,7 +791,7 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)):
 		email=user_in.email,
 		password_hash=get_password_hash(user_in.password),
 		role=user_in.role,
-		avatar_url=user_in.avatar_url,
+		avatar_url=canonical_image_path(user_in.avatar_url),
 		phone=user_in.phone,
 		country=user_in.country,
 		state=user_in.state,
@@ -395,6 +867,8 @@ def update_me(
     update_data = user_update.model_dump(exclude_unset=True)
     
     for field, value in update_data.items():
+        if field == 'avatar_url':
+            value = canonical_image_path(value)
         setattr(current, field, value)
     
     db.add(current)
@@ -425,80 +899,607 @@ def update_me(
 @app.post("/products", response_model=ProductOut, dependencies=[Depends(require_admin)])
 def create_product(product_in: ProductCreate, db: Session = Depends(get_db)):
 	attrs = sanitize_attributes(product_in.main_category, product_in.sub_category, product_in.attributes)
+	sku = _normalize_sku(product_in.sku)
+	if _sku_taken(db, sku):
+		raise HTTPException(status_code=400, detail="SKU já cadastrado")
 	
 	# Handle multiple images
 	image_urls_json = None
 	if product_in.image_urls:
-		image_urls_json = json.dumps(product_in.image_urls)
-	
-	# Handle size images
-	size_images_json = None
-	if product_in.size_images:
-		size_images_json = json.dumps(product_in.size_images)
-	
-	# Handle size colors
-	size_colors_json = None
-	if product_in.size_colors:
-		size_colors_json = json.dumps(product_in.size_colors)
-	
-	# Handle size stock
-	size_stock_json = None
-	if product_in.size_stock:
-		size_stock_json = json.dumps(product_in.size_stock)
+		image_urls_json = json.dumps(canonical_image_paths(product_in.image_urls))
 	
 	product = Product(
 		name=product_in.name,
 		price=product_in.price,
 		description=product_in.description,
-		image_url=product_in.image_url,
+		image_url=canonical_image_path(product_in.image_url),
 		image_urls_json=image_urls_json,
-		size_images_json=size_images_json,
-		size_colors_json=size_colors_json,
-		size_stock_json=size_stock_json,
 		category=product_in.category,
 		stock=product_in.stock,
 		main_category=product_in.main_category,
 		sub_category=product_in.sub_category,
-		attributes_json=json.dumps(attrs) if attrs else None,
+		main_category_norm=fold_text(product_in.main_category),
+		sub_category_norm=fold_text(product_in.sub_category),
+		sku=sku,
 	)
+	_set_attributes(product, attrs)
+	_set_variants(product, product_in.size_images, product_in.size_colors, product_in.size_stock)
 	db.add(product)
+	db.flush()
+	search_service.index_product(db, product)
+	_bump_catalog_version(db, [product.id])
 	db.commit()
 	db.refresh(product)
+	_sync_snapshot(db, [product.id])
 	return _product_to_out(product)
 
 
-@app.get("/products", response_model=List[ProductOut])
-def list_products(q: str = "", main_category: str = "", sub_category: str = "", db: Session = Depends(get_db)):
-	def _norm(s: Optional[str]) -> str:
-		if not s:
-			return ""
-		n = unicodedata.normalize('NFD', s)
-		return ''.join(ch for ch in n if unicodedata.category(ch) != 'Mn').lower()
+PRODUCTS_PAGE_MAX = 200
+
+
+ATTR_PARAM_PREFIX = "attr."
+
+
+def _attr_filters(request: Request) -> Dict[str, List[str]]:
+	"""Lê filtros de atributo da query string: attr.marca=Nike&attr.cor=azul&attr.cor=preto"""
+	filters: Dict[str, List[str]] = {}
+	for name, value in request.query_params.multi_items():
+		if name.startswith(ATTR_PARAM_PREFIX) and value.strip():
+			filters.setdefault(name[len(ATTR_PARAM_PREFIX):], []).append(fold_text(value.strip()))
+	return filters
 
-	query = db.query(Product)
-	if q:
-		query = query.filter(Product.name.ilike(f"%{q}%"))
-	items = query.order_by(Product.name.asc()).all()
 
+# Sem main_category (NULL, não "") mas com sub_category: o produto conta como Vestuário na listagem e nas facetas
+_UNTAGGED_CLOTHING = and_(Product.main_category_norm.is_(None), Product.sub_category_norm.isnot(None), Product.sub_category_norm != "")
+
+
+def _filter_catalog(query, q: str = "", main_category: str = "", sub_category: str = "", ranked: bool = False, attrs: Optional[Dict[str, List[str]]] = None, ordered: bool = False):
+	"""
+	Filtros do catálogo (busca, categorias e atributos) compartilhados pela listagem e pelas facetas.
+	Valores da mesma chave de atributo combinam com OR; chaves diferentes com AND.
+	ordered=True (listagem de Product, sem agregação): a regra de Vestuário vira UNION ALL,
+	para cada lado seguir o índice (main_category_norm, <ordenação>) sem ordenar a categoria inteira.
+	"""
+	if q:
+		query = search_service.apply_search(query, q, ranked=ranked)
+	if sub_category:
+		query = query.filter(Product.sub_category_norm == fold_text(sub_category))
+	for key, values in (attrs or {}).items():
+		query = query.filter(Product.id.in_(
+			select(ProductAttribute.product_id).where(ProductAttribute.key == key, ProductAttribute.value_norm.in_(values))
+		))
 	if main_category:
-		mc = _norm(main_category)
-		# Se main_category for "Vestuário", também buscar produtos com main_category None mas sub_category preenchida
-		if mc == "vestuario":
-			items = [p for p in items if (_norm(p.main_category) == mc or (p.main_category is None and p.sub_category))]
+		mc = fold_text(main_category)
+		if mc == "vestuario" and ordered and not q:
+			# Os filtros seguintes (preço, estoque, cursor) o SQLite empurra para dentro dos dois lados
+			query = query.filter(Product.main_category_norm == mc).union_all(query.filter(_UNTAGGED_CLOTHING))
+		elif mc == "vestuario":
+			query = query.filter(or_(Product.main_category_norm == mc, _UNTAGGED_CLOTHING))
 		else:
-			items = [p for p in items if _norm(p.main_category) == mc]
-	if sub_category:
-		sc = _norm(sub_category)
-		items = [p for p in items if _norm(p.sub_category) == sc]
+			query = query.filter(Product.main_category_norm == mc)
+	return query
+
+
+def _catalog_etag(request: Request, db: Session, scope: str, version: Optional[int] = None) -> str:
+	"""ETag forte derivado da versão do catálogo e dos parâmetros da consulta"""
+	params = hashlib.sha1(repr(sorted(request.query_params.multi_items())).encode('utf-8')).hexdigest()[:16]
+	if version is None:
+		version = _catalog_version(db)
+	return f'"{scope}-{version}-{params}"'
+
+
+# sort -> (colunas da chave, descendente?); id fecha o desempate e a chave do cursor
+PRODUCT_SORTS = {
+	"name": ((Product.name, Product.id), False),
+	"price": ((Product.price, Product.id), False),
+	"-price": ((Product.price, Product.id), True),
+	"newest": ((Product.id,), True),
+	"rating": ((Product.rating_avg, Product.id), True),
+}
+
+
+def _encode_product_cursor(p: Product, sort: str) -> str:
+	columns, _ = PRODUCT_SORTS[sort]
+	values = [getattr(p, c.key) for c in columns]
+	raw = json.dumps([sort, *values], ensure_ascii=False).encode('utf-8')
+	return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_product_cursor(cursor: str, sort: str) -> list:
+	try:
+		raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+		data = json.loads(raw.decode('utf-8'))
+		# Cursores antigos: [name, id]
+		if len(data) == 2 and isinstance(data[0], str) and isinstance(data[1], int) and data[0] not in PRODUCT_SORTS:
+			data = ["name", *data]
+		cursor_sort, values = data[0], data[1:]
+		if cursor_sort != sort or len(values) != len(PRODUCT_SORTS[sort][0]) or not isinstance(values[-1], int):
+			raise ValueError
+		return values
+	except Exception:
+		raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _snapshot_item(entry: catalog_snapshot.SnapshotEntry, view: str, fields: Optional[List[str]]):
+	if fields is not None:
+		return {f: getattr(entry.out, f) for f in fields}
+	return entry.card if view == "card" else entry.out
+
+
+def _list_from_snapshot(snapshot, sort_key, main_category, sub_category, min_price, max_price, in_stock, limit, cursor, view, fields):
+	"""Mesma resposta de list_products, filtrada e paginada sobre o snapshot"""
+	criteria = dict(
+		sort=sort_key,
+		main_category=fold_text(main_category) if main_category else None,
+		sub_category=fold_text(sub_category) if sub_category else None,
+		min_price=min_price,
+		max_price=max_price,
+		in_stock=in_stock,
+	)
+	if limit is None:
+		return [_snapshot_item(e, view, fields) for e in snapshot.select(**criteria)]
+	limit = max(1, min(limit, PRODUCTS_PAGE_MAX))
+	after = _decode_product_cursor(cursor, sort_key) if cursor else None
+	try:
+		rows = snapshot.select(**criteria, after=after, limit=limit + 1)
+	except TypeError:
+		# Cursor com valores de tipo diferente da coluna da ordenação
+		raise HTTPException(status_code=400, detail="Cursor inválido")
+	next_cursor = _encode_product_cursor(rows[limit - 1], sort_key) if len(rows) > limit else None
+	return ProductPage(items=[_snapshot_item(e, view, fields) for e in rows[:limit]], next_cursor=next_cursor)
+
+
+@app.get(
+	"/products",
+	response_model=Union[List[ProductOut], List[ProductCard], List[Dict[str, Any]], ProductPage],
+	response_model_exclude_unset=True,
+)
+def list_products(
+	request: Request,
+	response: Response,
+	q: str = "",
+	main_category: str = "",
+	sub_category: str = "",
+	limit: Optional[int] = None,
+	cursor: Optional[str] = None,
+	view: str = "full",
+	fields: str = "",
+	min_price: Optional[float] = None,
+	max_price: Optional[float] = None,
+	in_stock: bool = False,
+	sort: str = "",
+	db: Session = Depends(get_db),
+):
+	"""
+	Lista o catálogo, filtrável por atributos com `attr.<chave>=<valor>`, preço e estoque.
+	`sort` aceita name (padrão), price, -price, newest e rating; com `limit` devolve uma página
+	com `next_cursor` (keyset na chave da ordenação + id).
+	A busca `q` usa o índice full-text; sem paginação e sem `sort` os resultados vêm por relevância.
+	Responde 304 quando o If-None-Match bate com a versão atual do catálogo.
+	`view=card` ou `fields=a,b` devolvem projeções enxutas carregando só as colunas necessárias.
+	"""
+	field_list = _parse_product_view(view, fields)
+	if sort and sort not in PRODUCT_SORTS:
+		raise HTTPException(status_code=400, detail=f"sort deve ser um de: {', '.join(PRODUCT_SORTS)}")
+	attrs = _attr_filters(request)
+	# Busca textual e atributos vão sempre ao banco; o resto pode vir do snapshot em memória
+	snapshot = _current_snapshot(db) if not q and not attrs else None
+	etag = _catalog_etag(request, db, "catalog", snapshot.version if snapshot is not None else None)
+	if _etag_matches(request, etag):
+		return _not_modified(etag)
+	cached = cached_response(etag)
+	if cached is not None:
+		return cached
+	response.headers["ETag"] = etag
+	response.headers["Cache-Control"] = "no-cache"
+
+	sort_key = sort or "name"
+	sort_columns, descending = PRODUCT_SORTS[sort_key]
+	if snapshot is not None:
+		return _list_from_snapshot(snapshot, sort_key, main_category, sub_category, min_price, max_price, in_stock, limit, cursor, view, field_list)
+	query = db.query(Product).options(*_product_load_options(view, field_list, sort_columns))
+	query = _filter_catalog(query, q, main_category, sub_category, ranked=limit is None and not sort, attrs=attrs, ordered=True)
+	if min_price is not None:
+		query = query.filter(Product.price >= min_price)
+	if max_price is not None:
+		query = query.filter(Product.price <= max_price)
+	if in_stock:
+		# Literal (não parâmetro): o SQLite só usa o índice parcial "WHERE stock > 0" se o termo for igual
+		query = query.filter(Product.stock > literal_column("0"))
+	order_by = [c.desc() if descending else c.asc() for c in sort_columns]
+
+	# Sem limit: lista completa (compatibilidade com versões antigas do app)
+	if limit is None:
+		items = query.order_by(*order_by).all()
+		return [_serialize_product(p, view, field_list) for p in items]
+
+	limit = max(1, min(limit, PRODUCTS_PAGE_MAX))
+	if cursor:
+		key = tuple_(*sort_columns) if len(sort_columns) > 1 else sort_columns[0]
+		after = _decode_product_cursor(cursor, sort_key)
+		after = tuple(after) if len(sort_columns) > 1 else after[0]
+		query = query.filter(key < after if descending else key > after)
+	rows = query.order_by(*order_by).limit(limit + 1).all()
+	next_cursor = _encode_product_cursor(rows[limit - 1], sort_key) if len(rows) > limit else None
+	return ProductPage(
+		items=[_serialize_product(p, view, field_list) for p in rows[:limit]],
+		next_cursor=next_cursor,
+	)
+
+
+# Facetas em cache por combinação de filtros; descartadas quando a versão do catálogo muda
+FACETS_CACHE_MAX = 256
+_facets_cache: Dict[tuple, ProductFacets] = {}
+_facets_cache_version = -1
+_facets_lock = threading.Lock()
+
+
+def _facet_values(rows) -> List[FacetValue]:
+	return [FacetValue(value=str(label), count=count) for label, count in rows if label not in (None, "")]
+
+
+def _compute_facets(db: Session, q: str, main_category: str, sub_category: str, attrs: Dict[str, List[str]]) -> ProductFacets:
+	# Cada dimensão ignora o próprio filtro, para o app mostrar as alternativas disponíveis
+	# Mesmo agrupamento do filtro: os sem main_category que a listagem mostra em Vestuário contam em Vestuário
+	main_group = case((_UNTAGGED_CLOTHING, literal("vestuario")), else_=Product.main_category_norm)
+	main_label = func.max(case((_UNTAGGED_CLOTHING, literal("Vestuário")), else_=Product.main_category))
+	main_q = _filter_catalog(db.query(main_label, func.count(Product.id)), q, "", sub_category, attrs=attrs)
+	main_rows = main_q.group_by(main_group).order_by(func.count(Product.id).desc()).all()
+	sub_q = _filter_catalog(db.query(func.max(Product.sub_category), func.count(Product.id)), q, main_category, "", attrs=attrs)
+	sub_rows = sub_q.group_by(Product.sub_category_norm).order_by(func.count(Product.id).desc()).all()
+
+	attributes: Dict[str, List[FacetValue]] = {}
+	for key in FACET_ATTRS:
+		others = {k: v for k, v in attrs.items() if k != key}
+		ids = _filter_catalog(db.query(Product.id), q, main_category, sub_category, attrs=others)
+		rows = (
+			db.query(func.max(ProductAttribute.value), func.count(ProductAttribute.product_id))
+			.filter(ProductAttribute.key == key, ProductAttribute.product_id.in_(ids))
+			.group_by(ProductAttribute.value_norm)
+			.order_by(func.count(ProductAttribute.product_id).desc())
+			.all()
+		)
+		if rows:
+			attributes[key] = _facet_values(rows)
+
+	return ProductFacets(
+		main_categories=_facet_values(main_rows),
+		sub_categories=_facet_values(sub_rows),
+		attributes=attributes,
+	)
+
+
+@app.get("/products/facets", response_model=ProductFacets)
+def product_facets(
+	request: Request,
+	response: Response,
+	q: str = "",
+	main_category: str = "",
+	sub_category: str = "",
+	db: Session = Depends(get_db),
+):
+	"""Contagens por categoria e por valor de atributo, respeitando os filtros atuais (inclusive attr.*)"""
+	global _facets_cache_version
+	version = _catalog_version(db)
+	etag = _catalog_etag(request, db, "facets", version)
+	if _etag_matches(request, etag):
+		return _not_modified(etag)
+	cached = cached_response(etag)
+	if cached is not None:
+		return cached
+	response.headers["ETag"] = etag
+	response.headers["Cache-Control"] = "no-cache"
+
+	q = q.strip()
+	attrs = _attr_filters(request)
+	key = (
+		q, fold_text(main_category.strip()), fold_text(sub_category.strip()),
+		tuple(sorted((k, tuple(sorted(v))) for k, v in attrs.items())),
+	)
+	with _facets_lock:
+		if _facets_cache_version != version:
+			_facets_cache.clear()
+			_facets_cache_version = version
+		cached = _facets_cache.get(key)
+	if cached is not None:
+		return cached
+	facets = _compute_facets(db, q, main_category, sub_category, attrs)
+	with _facets_lock:
+		if _facets_cache_version == version:
+			if len(_facets_cache) >= FACETS_CACHE_MAX:
+				_facets_cache.pop(next(iter(_facets_cache)))
+			_facets_cache[key] = facets
+	return facets
+
+
+EXPORT_BATCH_SIZE = 500
+# Linhas por bloco enviado: o cliente recebe os dados enquanto o resto do lote ainda é serializado
+EXPORT_FLUSH_ROWS = 50
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+EXPORT_CSV_COLUMNS = ("id",) + tuple(f for f in PRODUCT_FIELDS if f != "id")
+
+
+def _export_catalog(fmt: str):
+	"""
+	Gera o catálogo lendo EXPORT_BATCH_SIZE produtos por vez do banco e enviando blocos de
+	EXPORT_FLUSH_ROWS linhas; o cabeçalho CSV sai antes da primeira consulta. Usa sessão própria:
+	a de get_db é fechada antes do corpo de um StreamingResponse ser enviado
+	"""
+	buffer = io.StringIO()
+	writer = csv.writer(buffer) if fmt == "csv" else None
+	if writer:
+		writer.writerow(EXPORT_CSV_COLUMNS)
+		yield buffer.getvalue()
+		buffer.seek(0)
+		buffer.truncate()
+	db = SessionLocal()
+	try:
+		query = db.query(Product).order_by(Product.id.asc()).yield_per(EXPORT_BATCH_SIZE)
+		count = 0
+		for p in query:
+			# _build_product_out direto: o export não deve expulsar do cache os produtos mais acessados
+			out = _build_product_out(p)
+			if writer:
+				row = out.model_dump()
+				writer.writerow([
+					json.dumps(row[f], ensure_ascii=False) if isinstance(row[f], (dict, list)) else ("" if row[f] is None else row[f])
+					for f in EXPORT_CSV_COLUMNS
+				])
+			else:
+				buffer.write(out.model_dump_json())
+				buffer.write("\n")
+			count += 1
+			if count % EXPORT_FLUSH_ROWS == 0:
+				yield buffer.getvalue()
+				buffer.seek(0)
+				buffer.truncate()
+		if buffer.tell():
+			yield buffer.getvalue()
+	finally:
+		db.close()
+
+
+@app.get("/products/export", dependencies=[Depends(require_admin)])
+def export_products(format: str = "ndjson"):
+	"""Exporta o catálogo completo em NDJSON ou CSV, transmitido à medida que é lido do banco"""
+	if format not in EXPORT_FORMATS:
+		raise HTTPException(status_code=400, detail="format deve ser 'ndjson' ou 'csv'")
+	filename = f"catalogo_{now_moz().strftime('%Y%m%d')}.{format}"
+	return StreamingResponse(
+		_export_catalog(format),
+		media_type=EXPORT_FORMATS[format],
+		headers={"Content-Disposition": f"attachment; filename={filename}"},
+	)
+
+
+IMPORT_BATCH_SIZE = 1000
+# Colunas do CSV que chegam como JSON (mesmo formato de /products/export)
+IMPORT_JSON_FIELDS = {"image_urls", "size_images", "size_colors", "size_stock", "attributes"}
+
+
+def read_import_records(stream, fmt: str) -> Iterator[Tuple[int, Any]]:
+	"""(linha, registro bruto) de um arquivo CSV ou NDJSON já aberto em modo texto"""
+	if fmt == "csv":
+		reader = csv.DictReader(stream)
+		for record in reader:
+			yield reader.line_num, record
+	else:
+		for line_no, line in enumerate(stream, start=1):
+			if line.strip():
+				yield line_no, line
+
+
+def _import_record_data(record: Any) -> Dict[str, Any]:
+	if isinstance(record, str):
+		data = json.loads(record)
+		if not isinstance(data, dict):
+			raise ValueError("a linha deve ser um objeto JSON")
+		return data
+	data = {}
+	for key, value in record.items():
+		# key None: valores além das colunas do cabeçalho
+		if key is None or value is None or not value.strip():
+			continue
+		data[key] = json.loads(value) if key in IMPORT_JSON_FIELDS else value.strip()
+	return data
+
+
+def _import_error_messages(exc: ValueError) -> List[str]:
+	if isinstance(exc, ValidationError):
+		return [f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in exc.errors()]
+	return [str(exc)]
+
+
+def _import_row(product_in: ProductCreate, sku: str) -> Tuple[Dict[str, Any], List[dict], List[tuple]]:
+	"""Colunas de products, linhas de product_variants e pares de product_attributes de um registro validado"""
+	attrs = sanitize_attributes(product_in.main_category, product_in.sub_category, product_in.attributes)
+	size_images = product_in.size_images
+	if size_images:
+		size_images = {size: canonical_image_paths(urls) for size, urls in size_images.items()}
+	values = {
+		"sku": sku,
+		"name": product_in.name,
+		"price": product_in.price,
+		"description": product_in.description,
+		"image_url": canonical_image_path(product_in.image_url),
+		"image_urls_json": json.dumps(canonical_image_paths(product_in.image_urls)) if product_in.image_urls else None,
+		"category": product_in.category,
+		"stock": product_in.stock,
+		"main_category": product_in.main_category,
+		"sub_category": product_in.sub_category,
+		"main_category_norm": fold_text(product_in.main_category),
+		"sub_category_norm": fold_text(product_in.sub_category),
+		"attributes_json": json.dumps(attrs) if attrs else None,
+	}
+	variants = _variant_rows(size_images, product_in.size_colors, product_in.size_stock)
+	return values, variants, attribute_pairs(attrs)
+
+
+def _upsert_product_batch(db: Session, batch: Dict[str, Tuple[Dict[str, Any], List[dict], List[tuple]]]) -> Tuple[int, List[int]]:
+	"""
+	Grava um lote (sku -> linha) com INSERT/UPDATE em executemany e uma transação.
+	Devolve (quantidade criada, ids atualizados)
+	"""
+	products = Product.__table__
+	skus = list(batch)
+	existing = dict(db.execute(select(Product.sku, Product.id).where(Product.sku.in_(skus))).all())
+	new_rows = [values for sku, (values, _, _) in batch.items() if sku not in existing]
+	changed = [dict(values, _id=existing[sku]) for sku, (values, _, _) in batch.items() if sku in existing]
+	if new_rows:
+		db.execute(products.insert(), new_rows)
+	if changed:
+		# As colunas vêm dos parâmetros; version sobe para invalidar caches e ETags
+		db.execute(
+			products.update().where(products.c.id == bindparam("_id")).values(version=products.c.version + 1),
+			changed,
+		)
+	ids = dict(db.execute(select(Product.sku, Product.id).where(Product.sku.in_(skus))).all())
+	product_ids = list(ids.values())
+	db.execute(ProductVariant.__table__.delete().where(ProductVariant.product_id.in_(product_ids)))
+	db.execute(ProductAttribute.__table__.delete().where(ProductAttribute.product_id.in_(product_ids)))
+	variant_rows = [dict(row, product_id=ids[sku]) for sku, (_, variants, _) in batch.items() for row in variants]
+	if variant_rows:
+		db.execute(ProductVariant.__table__.insert(), variant_rows)
+	attribute_rows = [
+		{"product_id": ids[sku], "key": k, "value": v, "value_norm": n}
+		for sku, (_, _, pairs) in batch.items() for k, v, n in pairs
+	]
+	if attribute_rows:
+		db.execute(ProductAttribute.__table__.insert(), attribute_rows)
+	search_service.index_products(db, product_ids)
+	_bump_catalog_version(db, product_ids)
+	db.commit()
+	return len(new_rows), list(existing.values())
+
+
+def import_products(db: Session, records: Iterable[Tuple[int, Any]], batch_size: int = IMPORT_BATCH_SIZE) -> ProductImportResult:
+	"""
+	Valida cada registro com ProductCreate e sanitize_attributes e faz upsert por sku,
+	um commit a cada batch_size produtos. Um produto existente é substituído pela linha
+	importada; se o mesmo sku se repete no lote, vale a última linha.
+	"""
+	result = ProductImportResult()
+	batch: Dict[str, Tuple[Dict[str, Any], List[dict], List[tuple]]] = {}
+
+	def flush():
+		created, updated_ids = _upsert_product_batch(db, batch)
+		result.created += created
+		result.updated += len(updated_ids)
+		for product_id in updated_ids:
+			product_cache.invalidate(product_id)
+		batch.clear()
+
+	for row, record in records:
+		data: Any = None
+		try:
+			data = _import_record_data(record)
+			product_in = ProductCreate.model_validate(data)
+		except ValueError as exc:
+			raw_sku = data.get("sku") if isinstance(data, dict) else None
+			result.errors.append(ProductImportError(
+				row=row, sku=str(raw_sku) if raw_sku is not None else None, errors=_import_error_messages(exc),
+			))
+			continue
+		sku = _normalize_sku(product_in.sku)
+		if not sku:
+			result.errors.append(ProductImportError(row=row, errors=["sku: obrigatório na importação"]))
+			continue
+		batch.pop(sku, None)
+		batch[sku] = _import_row(product_in, sku)
+		if len(batch) >= batch_size:
+			flush()
+	if batch:
+		flush()
+	# Depois de uma importação o snapshot é remontado inteiro na próxima leitura
+	catalog_snapshot.invalidate()
+	return result
+
+
+@app.post("/products/import", response_model=ProductImportResult, dependencies=[Depends(require_admin)])
+def import_products_file(file: UploadFile = File(...), format: Optional[str] = None, db: Session = Depends(get_db)):
+	"""Importação em lote (CSV ou NDJSON) com upsert por sku; linhas inválidas voltam em errors"""
+	fmt = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+	if fmt not in EXPORT_FORMATS:
+		raise HTTPException(status_code=400, detail="format deve ser 'ndjson' ou 'csv'")
+	stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+	try:
+		return import_products(db, read_import_records(stream, fmt))
+	except UnicodeDecodeError:
+		raise HTTPException(status_code=400, detail="O arquivo deve estar em UTF-8")
+
+
+PRODUCTS_BATCH_MAX = 300
+
+
+@app.get("/products/batch", response_model=ProductBatch, response_model_exclude_unset=True)
+def get_products_batch(ids: str, view: str = "full", db: Session = Depends(get_db)):
+	"""Busca vários produtos numa única consulta IN, mantendo a ordem de `ids` (ex: ids=3,1,2)"""
+	_parse_product_view(view, "")
+	try:
+		requested = list(dict.fromkeys(int(i) for i in ids.split(',') if i.strip()))
+	except ValueError:
+		raise HTTPException(status_code=400, detail="ids deve ser uma lista de inteiros separados por vírgula")
+	if len(requested) > PRODUCTS_BATCH_MAX:
+		raise HTTPException(status_code=400, detail=f"Máximo de {PRODUCTS_BATCH_MAX} ids por requisição")
+	found = {}
+	if requested:
+		rows = db.query(Product).options(*_product_load_options(view, None)).filter(Product.id.in_(requested)).all()
+		found = {p.id: p for p in rows}
+	return ProductBatch(
+		items=[_serialize_product(found[i], view) for i in requested if i in found],
+		missing=[i for i in requested if i not in found],
+	)
+
+
+POPULAR_MAX = 50
 
-	return [_product_to_out(p) for p in items]
+
+@app.get("/products/popular", response_model=List[ProductCard])
+def popular_products(days: int = 7, limit: int = 10, db: Session = Depends(get_db)):
+	"""Produtos mais vistos nos últimos `days` dias, pelas visualizações gravadas pelo visit_tracker"""
+	days = max(1, min(days, 365))
+	limit = max(1, min(limit, POPULAR_MAX))
+	ranked = (
+		db.query(DailyVisits.product_id, func.sum(DailyVisits.views).label('views'))
+		.filter(DailyVisits.product_id != CATALOG, DailyVisits.day >= sales_rollup.since(days))
+		.group_by(DailyVisits.product_id)
+		.subquery()
+	)
+	# O join descarta produtos removidos que ainda têm visualizações gravadas
+	products = (
+		db.query(Product)
+		.options(*_product_load_options("card", None))
+		.join(ranked, ranked.c.product_id == Product.id)
+		.order_by(ranked.c.views.desc(), Product.id)
+		.limit(limit)
+		.all()
+	)
+	return [_serialize_product(p, "card") for p in products]
 
 
 @app.get("/products/{product_id}", response_model=ProductOut)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-	product = db.get(Product, product_id)
-	if not product:
+def get_product(product_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+	snapshot = _current_snapshot(db)
+	if snapshot is not None:
+		entry = snapshot.by_id.get(product_id)
+		version = entry.version if entry is not None else None
+	else:
+		version = db.query(Product.version).filter(Product.id == product_id).scalar()
+	if version is None:
 		raise HTTPException(status_code=404, detail="Produto não encontrado")
+	etag = f'"product-{product_id}-{version}-{_URL_PREFIX_TAG}"'
+	if _etag_matches(request, etag):
+		return _not_modified(etag)
+	cached = cached_response(etag)
+	if cached is not None:
+		return cached
+	if snapshot is not None:
+		response.headers["ETag"] = etag
+		response.headers["Cache-Control"] = "no-cache"
+		return entry.out
+	product = db.get(Product, product_id)
+	response.headers["ETag"] = f'"product-{product_id}-{product.version}-{_URL_PREFIX_TAG}"'
+	response.headers["Cache-Control"] = "no-cache"
 	return _product_to_out(product)
 
 
@@ -529,8 +1530,17 @@ def create_review(product_id: int, review_in: ReviewCreate, current: User = Depe
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     review = Review(product_id=product_id, user_id=current.id, rating=review_in.rating, comment=review_in.comment)
     db.add(review)
+    # Mantém a média denormalizada usada por sort=rating
+    db.execute(
+        update(Product).where(Product.id == product_id).values(
+            rating_avg=(Product.rating_avg * Product.rating_count + review_in.rating) / (Product.rating_count + 1),
+            rating_count=Product.rating_count + 1,
+        )
+    )
+    _bump_catalog_version(db, [product_id])
     db.commit()
     db.refresh(review)
+    _sync_snapshot(db, [product_id])
     return review
 
 
@@ -590,22 +1600,40 @@ def update_product(product_id: int, product_in: ProductUpdate, db: Session = Dep
 	product = db.get(Product, product_id)
 	if not product:
 		raise HTTPException(status_code=404, detail="Produto não encontrado")
+	size_images, size_colors, size_stock = _variant_maps(product)
+	variants_changed = False
 	for field, value in product_in.dict(exclude_unset=True).items():
 		if field == 'attributes':
 			sanitized = sanitize_attributes(product_in.main_category or product.main_category, product_in.sub_category or product.sub_category, value)
-			setattr(product, 'attributes_json', json.dumps(sanitized) if sanitized is not None else None)
+			_set_attributes(product, sanitized)
 		elif field == 'image_urls':
-			setattr(product, 'image_urls_json', json.dumps(value) if value is not None else None)
+			setattr(product, 'image_urls_json', json.dumps(canonical_image_paths(value)) if value is not None else None)
+		elif field == 'image_url':
+			setattr(product, 'image_url', canonical_image_path(value))
 		elif field == 'size_images':
-			setattr(product, 'size_images_json', json.dumps(value) if value is not None else None)
+			size_images, variants_changed = value, True
 		elif field == 'size_colors':
-			setattr(product, 'size_colors_json', json.dumps(value) if value is not None else None)
+			size_colors, variants_changed = value, True
 		elif field == 'size_stock':
-			setattr(product, 'size_stock_json', json.dumps(value) if value is not None else None)
+			size_stock, variants_changed = value, True
+		elif field == 'sku':
+			sku = _normalize_sku(value)
+			if _sku_taken(db, sku, product.id):
+				raise HTTPException(status_code=400, detail="SKU já cadastrado")
+			product.sku = sku
 		else:
 			setattr(product, field, value)
+	if variants_changed:
+		_set_variants(product, size_images, size_colors, size_stock)
+	product.main_category_norm = fold_text(product.main_category)
+	product.sub_category_norm = fold_text(product.sub_category)
+	product.version = (product.version or 0) + 1
+	search_service.index_product(db, product)
+	_bump_catalog_version(db, [product.id])
 	db.commit()
+	product_cache.invalidate(product.id)
 	db.refresh(product)
+	_sync_snapshot(db, [product.id])
 	return _product_to_out(product)
 
 
@@ -614,48 +1642,175 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
 	product = db.get(Product, product_id)
 	if not product:
 		raise HTTPException(status_code=404, detail="Produto não encontrado")
+	search_service.remove_product(db, product.id)
 	db.delete(product)
+	_bump_catalog_version(db, [product_id])
 	db.commit()
+	product_cache.invalidate(product_id)
+	_sync_snapshot(db, removed=[product_id])
+	return None
+
+
+def _reserve_stock(db: Session, quantities: Dict[int, int], size_quantities: Dict[Tuple[int, str], int]) -> Optional[str]:
+	"""
+	Baixa o estoque com UPDATE condicional (stock >= quantidade) por produto e por
+	tamanho, sem ler-e-gravar em Python: dois pedidos simultâneos não vendem a mesma
+	unidade. Tamanhos sem estoque controlado (stock NULL) não limitam a venda.
+	Devolve a mensagem de erro do primeiro item sem estoque (o chamador faz rollback)
+	"""
+	for product_id, quantity in quantities.items():
+		updated = db.execute(
+			update(Product)
+			.where(Product.id == product_id, Product.stock >= quantity)
+			.values(stock=Product.stock - quantity, version=Product.version + 1)
+			.execution_options(synchronize_session=False)
+		).rowcount
+		if not updated:
+			return f"Estoque insuficiente para o produto {product_id}"
+	for (product_id, size), quantity in size_quantities.items():
+		updated = db.execute(
+			update(ProductVariant)
+			.where(
+				ProductVariant.product_id == product_id,
+				ProductVariant.size == size,
+				or_(ProductVariant.stock.is_(None), ProductVariant.stock >= quantity),
+			)
+			.values(stock=ProductVariant.stock - quantity)
+			.execution_options(synchronize_session=False)
+		).rowcount
+		if not updated:
+			return f"Estoque insuficiente para o produto {product_id} no tamanho {size}"
+	return None
+
+
+def _variant_for(product: Product, size: Optional[str]) -> Optional[ProductVariant]:
+	if size is None:
+		return None
+	return next((v for v in product.variants if v.size == size), None)
+
+
+def _check_variant(product: Product, size: Optional[str], color: Optional[str]) -> Optional[str]:
+	"""
+	Valida a cor contra a variante do tamanho escolhido (já carregada com o produto); devolve a mensagem de erro.
+	Tamanhos sem linha de variante (ou produtos sem variantes) são aceitos sem validar e vendem
+	do estoque do produto: o app ainda oferece tamanhos vindos de attributes.tamanho e dos padrões por subcategoria
+	"""
+	variant = _variant_for(product, size)
+	if variant is None:
+		return None
+	if color and variant.colors_json:
+		try:
+			colors = json.loads(variant.colors_json)
+		except Exception:
+			colors = None
+		if colors and color not in colors:
+			return f"Cor {color} indisponível para o produto {product.id} no tamanho {size}"
 	return None
 
 
 # Orders
 @app.post("/orders", response_model=OrderOut)
-async def create_order(order_in: OrderCreate, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_order(order_in: OrderCreate, request: Request, current: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+	"""
+	Com o header Idempotency-Key, retentativas do mesmo pedido recebem a resposta
+	da primeira chamada sem criar outro pedido, baixar estoque ou reenviar emails
+	"""
 	if current.role != UserRole.client:
 		raise HTTPException(status_code=403, detail="Apenas clientes podem criar pedidos")
+	key = request.headers.get(idempotency.HEADER)
+	if not key:
+		return await _place_order(order_in, current, db)
+	scope = (current.id, "POST /orders", key)
+	stored = await run_in_threadpool(idempotency.acquire, *scope, idempotency.request_hash(order_in.model_dump()))
+	if stored is not None:
+		return _replayed_response(stored)
+	try:
+		out = await _place_order(order_in, current, db)
+	except Exception:
+		await run_in_threadpool(idempotency.release, *scope)
+		raise
+	await run_in_threadpool(idempotency.complete, *scope, 200, out.model_dump_json())
+	return out
+
+
+async def _place_order(order_in: OrderCreate, current: User, db: AsyncSession) -> OrderOut:
+	"""Sessão async: o event loop segue atendendo outras requisições durante o I/O do banco"""
 	order = Order(user_id=current.id, status=OrderStatus.pending)
 	db.add(order)
-	db.flush()
+	await db.flush()
 	
 	items_data = []
 	subtotal = 0.0
+	item_count = 0
 	
+	quantities: Dict[int, int] = {}
 	for item in order_in.items:
-		product = db.get(Product, item.product_id)
-		if not product or product.stock < item.quantity:
-			raise HTTPException(status_code=400, detail=f"Estoque insuficiente para o produto {item.product_id}")
-		order_item = OrderItem(order_id=order.id, product_id=product.id, quantity=item.quantity, unit_price=product.price)
-		product.stock -= item.quantity
+		quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+	# As variantes vêm junto (selectin), então validar tamanho/cor não custa consultas extras
+	result = await db.execute(select(Product).where(Product.id.in_(quantities)))
+	products = {p.id: p for p in result.scalars()}
+	# Estoque por tamanho só existe para tamanhos com linha de variante; os demais baixam só o do produto
+	size_quantities: Dict[Tuple[int, str], int] = {}
+	for item in order_in.items:
+		if item.product_id in products and _variant_for(products[item.product_id], item.size) is not None:
+			key = (item.product_id, item.size)
+			size_quantities[key] = size_quantities.get(key, 0) + item.quantity
+	error = None
+	for item in order_in.items:
+		if item.product_id not in products:
+			error = f"Estoque insuficiente para o produto {item.product_id}"
+		else:
+			error = _check_variant(products[item.product_id], item.size, item.color)
+		if error:
+			break
+	error = error or await db.run_sync(_reserve_stock, quantities, size_quantities)
+	if error:
+		await db.rollback()
+		raise HTTPException(status_code=400, detail=error)
+	
+	for item in order_in.items:
+		product = products[item.product_id]
+		order_item = OrderItem(
+			order_id=order.id, product_id=product.id, quantity=item.quantity, unit_price=product.price,
+			size=item.size, color=item.color,
+		)
 		db.add(order_item)
 		
 		# Coletar dados para o email
 		item_total = product.price * item.quantity
 		subtotal += item_total
+		item_count += item.quantity
 		items_data.append({
 			'product_name': product.name,
 			'quantity': item.quantity,
 			'price': item_total,
-			'size': getattr(item, 'size', None),
-			'color': getattr(item, 'color', None)
+			'size': item.size,
+			'color': item.color
 		})
 	
-	db.commit()
-	db.refresh(order)
+	order.subtotal = subtotal
+	order.shipping_cost = SHIPPING_COST
+	order.total = subtotal + SHIPPING_COST
+	order.item_count = item_count
+	await db.run_sync(
+		sales_rollup.record_order, order.created_at,
+		[(item.product_id, item.quantity, products[item.product_id].price) for item in order_in.items],
+	)
 	
-	# Calcular total (você pode adicionar taxa de envio aqui)
-	shipping_cost = 50.0  # Taxa de envio fixa (pode ser dinâmica)
-	total = subtotal + shipping_cost
+	await db.run_sync(_bump_catalog_version, list(quantities))
+	await db.commit()
+	for item in order_in.items:
+		product_cache.invalidate(item.product_id)
+	# Estoque e versão mudaram por UPDATE direto: recarrega o pedido com itens e produtos atualizados
+	order_id = order.id
+	db.expire_all()
+	if catalog_snapshot.enabled:
+		# Leitura pela sessão async; serializar as entradas é CPU, então vai para uma thread fora do event loop
+		version = (await db.execute(select(AppCounter.value).where(AppCounter.key == CATALOG_COUNTER))).scalar() or 0
+		result = await db.execute(select(Product).where(Product.id.in_(quantities)))
+		await run_in_threadpool(_apply_to_snapshot, version, list(result.scalars()))
+	result = await db.execute(select(Order).options(*_order_load_options("full")).where(Order.id == order_id))
+	order = result.scalar_one()
 	
 	# Preparar endereço
 	shipping_address = f"{current.street or ''}, {current.number or ''}, {current.city or ''}, {current.state or ''}, {current.country or ''}"
@@ -672,9 +1827,9 @@ async def create_order(order_in: OrderCreate, current: User = Depends(get_curren
 				payment_method="M-Pesa",  # Pode ser dinâmico
 				shipping_address=shipping_address,
 				items=items_data,
-				subtotal=subtotal,
-				shipping_cost=shipping_cost,
-				total=total
+				subtotal=order.subtotal,
+				shipping_cost=order.shipping_cost,
+				total=order.total
 			)
 			
 			# Email para o admin
@@ -687,9 +1842,9 @@ async def create_order(order_in: OrderCreate, current: User = Depends(get_curren
 				payment_method="M-Pesa",
 				shipping_address=shipping_address,
 				items=items_data,
-				subtotal=subtotal,
-				shipping_cost=shipping_cost,
-				total=total
+				subtotal=order.subtotal,
+				shipping_cost=order.shipping_cost,
+				total=order.total
 			)
 		except Exception as e:
 			# Logs do erro mas não bloqueia a criação do pedido
@@ -701,17 +1856,19 @@ async def create_order(order_in: OrderCreate, current: User = Depends(get_curren
 	return _order_to_out(order)
 
 
-def _order_to_out(order: Order) -> OrderOut:
+def _order_to_out(order: Order, view: str = "full") -> OrderOut:
 	"""Converte Order para OrderOut, normalizando imagens dos produtos"""
 	normalized_items = []
 	for item in order.items:
 		# Usar _product_to_out para normalizar o produto
-		normalized_product = _product_to_out(item.product)
+		normalized_product = _serialize_product(item.product, view)
 		normalized_items.append({
 			'id': item.id,
 			'product_id': item.product_id,
 			'quantity': item.quantity,
 			'unit_price': item.unit_price,
+			'size': item.size,
+			'color': item.color,
 			'product': normalized_product,
 		})
 	return OrderOut(
@@ -719,13 +1876,83 @@ def _order_to_out(order: Order) -> OrderOut:
 		user_id=order.user_id,
 		status=order.status,
 		created_at=order.created_at,
+		subtotal=order.subtotal,
+		shipping_cost=order.shipping_cost,
+		total=order.total,
+		item_count=order.item_count,
 		items=normalized_items,
 	)
 
-@app.get("/orders", response_model=List[OrderOut])
-def list_my_orders(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-	orders = db.query(Order).order_by(Order.created_at.desc()).all() if current.role == UserRole.admin else db.query(Order).filter(Order.user_id == current.id).order_by(Order.created_at.desc()).all()
-	return [_order_to_out(order) for order in orders]
+def _order_load_options(view: str) -> list:
+	"""Itens e produtos em consultas IN (selectin), em vez de uma consulta por pedido e por item"""
+	products = selectinload(Order.items).selectinload(OrderItem.product)
+	if view != "card":
+		return [products]
+	return [products.options(load_only(*_CARD_COLUMNS), noload(Product.variants))]
+
+
+ORDERS_PAGE_MAX = 100
+
+
+def _encode_order_cursor(order: Order) -> str:
+	raw = json.dumps([order.created_at.isoformat(), order.id]).encode('utf-8')
+	return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_order_cursor(cursor: str) -> tuple:
+	try:
+		raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+		created_at, order_id = json.loads(raw.decode('utf-8'))
+		if not isinstance(order_id, int):
+			raise ValueError
+		return datetime.fromisoformat(created_at), order_id
+	except Exception:
+		raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+@app.get("/orders", response_model=Union[List[OrderOut], OrderPage], response_model_exclude_unset=True)
+def list_my_orders(
+	view: str = "full",
+	limit: Optional[int] = None,
+	cursor: Optional[str] = None,
+	status_filter: Optional[OrderStatus] = Query(None, alias="status"),
+	date_from: Optional[datetime] = None,
+	date_to: Optional[datetime] = None,
+	user_id: Optional[int] = None,
+	current: User = Depends(get_current_user),
+	db: Session = Depends(get_db),
+):
+	"""
+	Pedidos mais recentes primeiro. Filtros: status, date_from <= created_at < date_to e
+	user_id (só admin; clientes veem apenas os próprios). Com `limit` devolve uma página
+	com `next_cursor` (keyset em created_at + id).
+	"""
+	_parse_product_view(view, "")
+	query = db.query(Order).options(*_order_load_options(view))
+	if current.role != UserRole.admin:
+		if user_id is not None and user_id != current.id:
+			raise HTTPException(status_code=403, detail="Sem permissão para ver pedidos de outro usuário")
+		user_id = current.id
+	if user_id is not None:
+		query = query.filter(Order.user_id == user_id)
+	if status_filter is not None:
+		query = query.filter(Order.status == status_filter)
+	if date_from is not None:
+		query = query.filter(Order.created_at >= date_from)
+	if date_to is not None:
+		query = query.filter(Order.created_at < date_to)
+	query = query.order_by(Order.created_at.desc(), Order.id.desc())
+
+	# Sem limit: lista completa (compatibilidade com versões antigas do app)
+	if limit is None:
+		return [_order_to_out(order, view) for order in query.all()]
+
+	limit = max(1, min(limit, ORDERS_PAGE_MAX))
+	if cursor:
+		query = query.filter(tuple_(Order.created_at, Order.id) < _decode_order_cursor(cursor))
+	orders = query.limit(limit + 1).all()
+	next_cursor = _encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+	return OrderPage(items=[_order_to_out(order, view) for order in orders[:limit]], next_cursor=next_cursor)
 
 
 @app.get("/orders/{order_id}/receipt")
@@ -740,27 +1967,18 @@ def download_receipt(order_id: int, current: User = Depends(get_current_user), d
 	if current.role != UserRole.admin and order.user_id != current.id:
 		raise HTTPException(status_code=403, detail="Sem permissão para acessar este recibo")
 	
-	# Preparar dados dos itens
+	# Preparar dados dos itens (os totais já estão gravados no pedido)
 	items_data = []
-	subtotal = 0.0
-	
 	for order_item in order.items:
-		item_total = order_item.unit_price * order_item.quantity
-		subtotal += item_total
-		
 		items_data.append({
 			'product_name': order_item.product.name,
 			'quantity': order_item.quantity,
 			'unit_price': order_item.unit_price,
-			'total_price': item_total,
-			'size': None,  # TODO: adicionar tamanho e cor ao OrderItem
-			'color': None
+			'total_price': order_item.unit_price * order_item.quantity,
+			'size': order_item.size,
+			'color': order_item.color
 		})
 	
-	# Calcular total
-	shipping_cost = 50.0  # Taxa fixa (pode ser dinâmica)
-	total = subtotal + shipping_cost
-	
 	# Preparar endereço
 	user = order.user
 	shipping_address = f"{user.street or ''}, {user.number or ''}, {user.city or ''}, {user.state or ''}, {user.country or ''}".strip(', ')
@@ -782,9 +2000,9 @@ def download_receipt(order_id: int, current: User = Depends(get_current_user), d
 			shipping_address=shipping_address,
 			payment_method="M-Pesa",  # Pode ser dinâmico
 			items=items_data,
-			subtotal=subtotal,
-			shipping_cost=shipping_cost,
-			total=total,
+			subtotal=order.subtotal,
+			shipping_cost=order.shipping_cost,
+			total=order.total,
 			output_path=pdf_path
 		)
 	except Exception as e:
@@ -800,15 +2018,17 @@ def download_receipt(order_id: int, current: User = Depends(get_current_user), d
 
 
 @app.put("/orders/{order_id}/status", response_model=OrderOut, dependencies=[Depends(require_admin)])
-async def update_order_status(order_id: int, status_value: OrderStatus, db: Session = Depends(get_db)):
-	order = db.get(Order, order_id)
+async def update_order_status(order_id: int, status_value: OrderStatus, db: AsyncSession = Depends(get_async_db)):
+	result = await db.execute(
+		select(Order).options(*_order_load_options("full"), selectinload(Order.user)).where(Order.id == order_id)
+	)
+	order = result.scalar_one_or_none()
 	if not order:
 		raise HTTPException(status_code=404, detail="Pedido não encontrado")
 	
 	old_status = order.status
 	order.status = status_value
-	db.commit()
-	db.refresh(order)
+	await db.commit()
 	
 	# Normalizar order antes de retornar
 	normalized_order = _order_to_out(order)
@@ -822,8 +2042,8 @@ async def update_order_status(order_id: int, status_value: OrderStatus, db: Sess
 				'product_name': order_item.product.name,
 				'quantity': order_item.quantity,
 				'price': order_item.unit_price * order_item.quantity,
-				'size': None,  # TODO: adicionar tamanho e cor ao OrderItem
-				'color': None
+				'size': order_item.size,
+				'color': order_item.color
 			})
 		
 		# Preparar endereço
@@ -878,6 +2098,9 @@ def delete_order(order_id: int, db: Session = Depends(get_db)):
 	order = db.get(Order, order_id)
 	if not order:
 		raise HTTPException(status_code=404, detail="Pedido não encontrado")
+	sales_rollup.record_order(
+		db, order.created_at, [(item.product_id, item.quantity, item.unit_price) for item in order.items], sign=-1,
+	)
 	db.delete(order)
 	db.commit()
 	return None
@@ -928,43 +2151,44 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
 
 # Reports (admin)
 @app.get("/admin/reports")
-def admin_reports(days: int = 30, db: Session = Depends(get_db), current: User = Depends(get_current_user)):
+def admin_reports(days: int = 30, fresh: bool = False, current: User = Depends(get_current_user)):
+    """
+    Painel do admin. O resultado de cada janela fica em cache por REPORTS_CACHE_TTL
+    segundos; depois disso o valor anterior é servido enquanto um recálculo roda em
+    segundo plano. `fresh=1` força o recálculo; `generated_at` diz quando foi calculado
+    """
     if current.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Apenas admin")
     days = max(1, min(days, 365))
+    return report_cache.get(days, lambda: _compute_admin_report(days), fresh=fresh)
+
+def _compute_admin_report(days: int) -> dict:
+    # Sessão própria: pode rodar no thread de recálculo, depois que a requisição terminou
+    with SessionLocal() as db:
+        return _build_admin_report(db, days)
+
+def _build_admin_report(db: Session, days: int) -> dict:
+    generated_at = now_moz()
     # Totais básicos
     total_users = db.query(func.count(User.id)).scalar() or 0
-    total_orders = db.query(func.count(Order.id)).scalar() or 0
     total_products = db.query(func.count(Product.id)).scalar() or 0
-    # Receita bruta somando itens
-    total_revenue = db.query(func.coalesce(func.sum(OrderItem.unit_price * OrderItem.quantity), 0)).scalar() or 0.0
-    # Por dia (últimos 30 dias)
-    try:
-        rows = db.query(
-            func.date(Order.created_at).label('d'),
-            func.count(Order.id).label('orders')
-        ).filter(Order.created_at >= text(f"date('now','-{days} day')"))
-        rows = rows.group_by('d').order_by('d').all()
-        orders_by_day = [{"date": r.d, "orders": r.orders} for r in rows]
-    except Exception:
-        orders_by_day = []
+    # Pedidos e receita bruta (itens, sem frete) pelos resumos diários: uma linha por dia
+    total_orders, total_revenue = db.query(
+        func.coalesce(func.sum(DailySales.orders), 0), func.coalesce(func.sum(DailySales.revenue), 0)
+    ).one()
+    since = sales_rollup.since(days)
+    # Pedidos e receita por dia nos últimos 'days'
     try:
-        rows2 = db.query(
-            func.date(OrderItem.order_id == Order.id),  # dummy to keep sqlite happy in selection
+        rows = (
+            db.query(DailySales)
+            .filter(DailySales.day >= since, DailySales.orders > 0)
+            .order_by(DailySales.day)
+            .all()
         )
+        orders_by_day = [{"date": r.day.isoformat(), "orders": r.orders} for r in rows]
+        revenue_by_day = [{"date": r.day.isoformat(), "revenue": round(r.revenue, 2)} for r in rows]
     except Exception:
-        pass
-    # Receita por dia (últimos 30 dias) via join
-    try:
-        q = db.query(
-            func.date(Order.created_at).label('d'),
-            func.coalesce(func.sum(OrderItem.unit_price * OrderItem.quantity), 0).label('revenue')
-        ).join(OrderItem, OrderItem.order_id == Order.id)
-        q = q.filter(Order.created_at >= text(f"date('now','-{days} day')"))
-        q = q.group_by('d').order_by('d')
-        rows_rev = q.all()
-        revenue_by_day = [{"date": r.d, "revenue": float(r.revenue)} for r in rows_rev]
-    except Exception:
+        orders_by_day = []
         revenue_by_day = []
     # Status de pedidos
     try:
@@ -976,22 +2200,39 @@ def admin_reports(days: int = 30, db: Session = Depends(get_db), current: User =
     try:
         qtop = db.query(
             Product.name,
-            func.coalesce(func.sum(OrderItem.unit_price * OrderItem.quantity), 0).label('revenue')
-        ).join(OrderItem, OrderItem.product_id == Product.id).join(Order, Order.id == OrderItem.order_id)
-        qtop = qtop.filter(Order.created_at >= text(f"date('now','-{days} day')")).group_by(Product.name).order_by(text('revenue DESC')).limit(5)
+            func.coalesce(func.sum(DailyProductSales.revenue), 0).label('revenue')
+        ).join(DailyProductSales, DailyProductSales.product_id == Product.id)
+        qtop = qtop.filter(DailyProductSales.day >= since).group_by(Product.name).order_by(text('revenue DESC')).limit(5)
         top_rows = qtop.all()
-        top_products = [{"name": n, "revenue": float(r)} for (n, r) in top_rows]
+        top_products = [{"name": n, "revenue": round(float(r), 2)} for (n, r) in top_rows]
     except Exception:
         top_products = []
-    # Visitas: sem tracking, placeholder 0
-    visits_total = 0
-    visits_by_day = []
+    # Visitas ao catálogo e produtos mais vistos (contados pelo visit_tracker, gravados em lote)
+    try:
+        visits_total = db.query(func.coalesce(func.sum(DailyVisits.views), 0)).filter(DailyVisits.product_id == CATALOG).scalar() or 0
+        rows = (
+            db.query(DailyVisits.day, DailyVisits.views)
+            .filter(DailyVisits.product_id == CATALOG, DailyVisits.day >= since)
+            .order_by(DailyVisits.day)
+            .all()
+        )
+        visits_by_day = [{"date": d.isoformat(), "visits": v} for (d, v) in rows]
+        qviews = db.query(
+            Product.name,
+            func.sum(DailyVisits.views).label('views')
+        ).join(DailyVisits, DailyVisits.product_id == Product.id)
+        qviews = qviews.filter(DailyVisits.day >= since).group_by(Product.id, Product.name).order_by(text('views DESC')).limit(5)
+        top_viewed = [{"name": n, "views": v} for (n, v) in qviews.all()]
+    except Exception:
+        visits_total = 0
+        visits_by_day = []
+        top_viewed = []
     return {
         "totals": {
             "users": total_users,
             "orders": total_orders,
             "products": total_products,
-            "revenue": float(total_revenue),
+            "revenue": round(float(total_revenue), 2),
             "visits": visits_total,
         },
         "orders_by_day": orders_by_day,
@@ -999,8 +2240,22 @@ def admin_reports(days: int = 30, db: Session = Depends(get_db), current: User =
         "visits_by_day": visits_by_day,
         "order_statuses": order_statuses,
         "top_products": top_products,
+        "top_viewed": top_viewed,
+        "generated_at": generated_at.isoformat(),
     }
 
+@app.get("/admin/cache", dependencies=[Depends(require_admin)])
+def cache_stats():
+	"""Contadores do cache de serialização de produtos, de respostas comprimidas e de relatórios"""
+	return {
+		"products": product_cache.stats(),
+		"responses": body_cache.stats(),
+		"snapshot": catalog_snapshot.stats(),
+		"reports": report_cache.stats(),
+		"visits": visit_buffer.stats(),
+	}
+
+
 # Favorites
 @app.get("/favorites", response_model=List[int])
 def list_favorites(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -1008,6 +2263,21 @@ def list_favorites(current: User = Depends(get_current_user), db: Session = Depe
 	return [r.product_id for r in rows]
 
 
+@app.get("/favorites/products", response_model=Union[List[ProductOut], List[ProductCard]], response_model_exclude_unset=True)
+def list_favorite_products(view: str = "full", current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+	"""Produtos favoritos já hidratados numa única consulta (view=card para a listagem)"""
+	_parse_product_view(view, "")
+	products = (
+		db.query(Product)
+		.join(Favorite, Favorite.product_id == Product.id)
+		.filter(Favorite.user_id == current.id)
+		.options(*_product_load_options(view, None))
+		.order_by(Favorite.id.asc())
+		.all()
+	)
+	return [_serialize_product(p, view) for p in products]
+
+
 @app.post("/favorites/{product_id}", status_code=204)
 def add_favorite(product_id: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
 	exists = db.query(Favorite).filter(Favorite.user_id == current.id, Favorite.product_id == product_id).first()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Mede quanto uma rajada de pedidos atrasa as outras requisições do mesmo worker.
+Dispara --orders POST /orders (até --concurrency ao mesmo tempo) e, durante a rajada,
+faz GET / a cada --probe-interval segundos, medindo a latência de cada sonda.
+
+Precisa de um servidor rodando, um cliente cadastrado e um produto com estoque >= --orders:
+    uvicorn backend.main:app --workers 1
+    python -m backend.medir_latencia_pedidos --email cliente@x.com --password segredo --product-id 1
+Requer httpx (backend/requirements-dev.txt)
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def _run(args) -> None:
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as http:
+        r = await http.post("/auth/login", json={"email": args.email, "password": args.password})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        body = {"items": [{"product_id": args.product_id, "quantity": 1}]}
+
+        statuses: Counter = Counter()
+        probes = []
+        done = asyncio.Event()
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def order():
+            async with slots:
+                statuses[(await http.post("/orders", json=body, headers=headers)).status_code] += 1
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await http.get("/")
+                probes.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(args.probe_interval)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*[order() for _ in range(args.orders)])
+        burst = time.perf_counter() - started
+        done.set()
+        await prober
+
+    print(f"Rajada: {args.orders} pedidos em {burst:.1f}s, status {dict(statuses)}")
+    if probes:
+        print(
+            f"GET / durante a rajada: {len(probes)} sondas, p50 {statistics.median(probes):.1f}ms, "
+            f"p99 {_percentile(probes, 0.99):.1f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--product-id", type=int, required=True)
+    parser.add_argument("--orders", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probe-interval", type=float, default=0.005)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
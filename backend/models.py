@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, DateTime, Enum, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, Date, DateTime, Enum, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from datetime import datetime
+from datetime import date, datetime
 import enum
 
 from backend.database import Base
@@ -43,6 +43,7 @@ class Product(Base):
 	description: Mapped[str | None] = mapped_column(Text, nullable=True)
 	image_url: Mapped[str | None] = mapped_column(String(300), nullable=True)
 	image_urls_json: Mapped[str | None] = mapped_column(Text, nullable=True)     # JSON array com múltiplas imagens
+	# Legado: migrados para product_variants na inicialização e não mais gravados
 	size_images_json: Mapped[str | None] = mapped_column(Text, nullable=True)    # JSON com múltiplas fotos por tamanho {"42": ["url1", "url2"], "43": ["url3"]}
 	size_colors_json: Mapped[str | None] = mapped_column(Text, nullable=True)    # JSON com cores por tamanho {"42": "azul", "43": "vermelho"}
 	size_stock_json: Mapped[str | None] = mapped_column(Text, nullable=True)     # JSON com estoque por tamanho {"42": 5, "43": 3}
@@ -51,8 +52,151 @@ class Product(Base):
 	main_category: Mapped[str | None] = mapped_column(String(80), nullable=True)  # ex: Vestuário, Tecnologia
 	sub_category: Mapped[str | None] = mapped_column(String(80), nullable=True)   # ex: Sapato, Camisa, Laptop
 	attributes_json: Mapped[str | None] = mapped_column(Text, nullable=True)      # JSON com atributos dinâmicos
+	# Cópias sem acento/minúsculas de main_category/sub_category, usadas nos filtros do catálogo
+	main_category_norm: Mapped[str | None] = mapped_column(String(80), nullable=True)
+	sub_category_norm: Mapped[str | None] = mapped_column(String(80), nullable=True)
+	# Incrementada a cada escrita no produto (edição, baixa de estoque); chave dos caches
+	version: Mapped[int] = mapped_column(Integer, default=1, server_default='1', nullable=False)
+	# Média/quantidade de avaliações, mantidas por create_review (ordenação sort=rating)
+	rating_avg: Mapped[float] = mapped_column(Float, default=0, server_default='0', nullable=False)
+	rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+	# Código do fornecedor; chave do upsert da importação em lote
+	sku: Mapped[str | None] = mapped_column(String(80), nullable=True)
 
 	items: Mapped[list["OrderItem"]] = relationship("OrderItem", back_populates="product")
+	variants: Mapped[list["ProductVariant"]] = relationship(
+		"ProductVariant", back_populates="product", cascade="all, delete-orphan",
+		lazy="selectin", order_by="ProductVariant.id",
+	)
+	attribute_rows: Mapped[list["ProductAttribute"]] = relationship(
+		"ProductAttribute", back_populates="product", cascade="all, delete-orphan",
+	)
+
+	# (name, id) sustenta a paginação por cursor do catálogo
+	__table_args__ = (
+		Index('ix_products_name_id', 'name', 'id'),
+		Index('ix_products_main_sub_norm', 'main_category_norm', 'sub_category_norm'),
+		# O SQLite guarda o rowid (= id) no fim de todo índice: este também serve sub_category + sort=newest
+		Index('ix_products_sub_category_norm', 'sub_category_norm'),
+		# Ordenações do catálogo, sozinhas ou dentro de uma categoria
+		Index('ix_products_price_id', 'price', 'id'),
+		Index('ix_products_rating_id', 'rating_avg', 'id'),
+		Index('ix_products_main_norm_name', 'main_category_norm', 'name', 'id'),
+		Index('ix_products_main_norm_price', 'main_category_norm', 'price', 'id'),
+		Index('ix_products_main_norm_id', 'main_category_norm', 'id'),
+		Index('ix_products_main_norm_rating', 'main_category_norm', 'rating_avg', 'id'),
+		Index('ix_products_sub_norm_name', 'sub_category_norm', 'name', 'id'),
+		Index('ix_products_sub_norm_price', 'sub_category_norm', 'price', 'id'),
+		Index('ix_products_sub_norm_rating', 'sub_category_norm', 'rating_avg', 'id'),
+		# in_stock com sort=newest: percorre só os produtos com estoque, já na ordem de id
+		Index('ix_products_in_stock_id', 'id', sqlite_where=text('stock > 0'), postgresql_where=text('stock > 0')),
+		Index('ux_products_sku', 'sku', unique=True),
+	)
+
+
+class ProductVariant(Base):
+	"""Um tamanho do produto. Colunas NULL = tamanho ausente daquele mapa na API (size_images/size_colors/size_stock)"""
+	__tablename__ = "product_variants"
+
+	id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+	product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+	size: Mapped[str] = mapped_column(String(40), nullable=False)
+	colors_json: Mapped[str | None] = mapped_column(Text, nullable=True)      # JSON array ["azul", "preto"]
+	stock: Mapped[int | None] = mapped_column(Integer, nullable=True)
+	image_urls_json: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON array com fotos do tamanho
+
+	product: Mapped["Product"] = relationship("Product", back_populates="variants")
+
+	__table_args__ = (
+		UniqueConstraint('product_id', 'size', name='uq_variant_product_size'),
+		Index('ix_product_variants_size_stock', 'size', 'stock'),
+	)
+
+
+class ProductAttribute(Base):
+	"""Atributo (chave, valor) de um produto, espelho indexável de attributes_json"""
+	__tablename__ = "product_attributes"
+
+	id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+	product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+	key: Mapped[str] = mapped_column(String(50), nullable=False)
+	value: Mapped[str] = mapped_column(String(200), nullable=False)
+	value_norm: Mapped[str] = mapped_column(String(200), nullable=False)  # sem acento/minúsculo, usado nos filtros
+
+	product: Mapped["Product"] = relationship("Product", back_populates="attribute_rows")
+
+	__table_args__ = (Index('ix_product_attributes_key_value', 'key', 'value_norm', 'product_id'),)
+
+
+class AppCounter(Base):
+	"""Contadores globais compartilhados entre workers (ex: versão do catálogo)"""
+	__tablename__ = "app_counters"
+
+	key: Mapped[str] = mapped_column(String(50), primary_key=True)
+	value: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class CatalogChange(Base):
+	"""Produtos tocados em cada versão do catálogo; workers em CATALOG_SNAPSHOT=shared se atualizam por aqui"""
+	__tablename__ = "catalog_changes"
+
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	version: Mapped[int] = mapped_column(Integer, nullable=False)
+	product_id: Mapped[int] = mapped_column(Integer, nullable=False)
+
+	__table_args__ = (Index('ix_catalog_changes_version', 'version'),)
+
+
+class IdempotencyKey(Base):
+	"""Resposta guardada de uma escrita feita com o header Idempotency-Key"""
+	__tablename__ = "idempotency_keys"
+
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	user_id: Mapped[int] = mapped_column(Integer, nullable=False)  # 0 = requisição sem login
+	endpoint: Mapped[str] = mapped_column(String(100), nullable=False)
+	key: Mapped[str] = mapped_column(String(255), nullable=False)
+	request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+	# NULL enquanto a primeira requisição ainda está em andamento
+	response_status: Mapped[int | None] = mapped_column(Integer, nullable=True)
+	response_body: Mapped[str | None] = mapped_column(Text, nullable=True)
+	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+	expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+	__table_args__ = (
+		UniqueConstraint('user_id', 'endpoint', 'key', name='uq_idempotency_user_endpoint_key'),
+		Index('ix_idempotency_keys_expires_at', 'expires_at'),
+	)
+
+
+class DailySales(Base):
+	"""Totais de pedidos por dia (UTC), mantidos junto com a criação/remoção de pedidos"""
+	__tablename__ = "daily_sales"
+
+	day: Mapped[date] = mapped_column(Date, primary_key=True)
+	orders: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	items: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	revenue: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+
+class DailyProductSales(Base):
+	"""Quantidade e receita por produto e dia; sem FK para não travar a remoção de produtos"""
+	__tablename__ = "daily_product_sales"
+
+	day: Mapped[date] = mapped_column(Date, primary_key=True)
+	product_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	revenue: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+
+class DailyVisits(Base):
+	"""Aberturas do catálogo (product_id 0) e visualizações de produto por dia, gravadas em lote pelo visit_tracker"""
+	__tablename__ = "daily_visits"
+
+	day: Mapped[date] = mapped_column(Date, primary_key=True)
+	product_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	views: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+	__table_args__ = (Index('ix_daily_visits_product_day', 'product_id', 'day'),)
 
 
 class OrderStatus(str, enum.Enum):
@@ -69,10 +213,23 @@ class Order(Base):
 	user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 	status: Mapped[str] = mapped_column(Enum(OrderStatus), default=OrderStatus.pending)
 	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+	# Gravados uma vez na criação: listagens, recibos e relatórios não somam os itens
+	subtotal: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+	shipping_cost: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+	total: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+	item_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
 	user: Mapped["User"] = relationship("User", back_populates="orders")
 	items: Mapped[list["OrderItem"]] = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+	# Listagem de pedidos: por cliente e geral, ambas ordenadas por (created_at, id)
+	__table_args__ = (
+		Index('ix_orders_user_created', 'user_id', 'created_at', 'id'),
+		Index('ix_orders_created_id', 'created_at', 'id'),
+		# Contagem por status do relatório percorre só o índice
+		Index('ix_orders_status', 'status'),
+	)
+
 
 class OrderItem(Base):
 	__tablename__ = "order_items"
@@ -82,10 +239,17 @@ class OrderItem(Base):
 	product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
 	quantity: Mapped[int] = mapped_column(Integer, default=1)
 	unit_price: Mapped[float] = mapped_column(Float, nullable=False)
+	# Variante escolhida; o estoque do tamanho é baixado em product_variants
+	size: Mapped[str | None] = mapped_column(String(40), nullable=True)
+	color: Mapped[str | None] = mapped_column(String(40), nullable=True)
 
 	order: Mapped["Order"] = relationship("Order", back_populates="items")
 	product: Mapped["Product"] = relationship("Product", back_populates="items")
 
+	__table_args__ = (
+		Index('ix_order_items_order_id', 'order_id'),
+	)
+
 
 class Favorite(Base):
 	__tablename__ = "favorites"
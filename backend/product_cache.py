@@ -0,0 +1,61 @@
+"""
+Cache de Serialização de Produtos - SwiftShop
+LRU limitado de ProductOut prontos, validado pela versão da linha do produto
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import os
+import threading
+
+
+class ProductCache:
+    """
+    Guarda um payload por produto junto com a versão da linha que o gerou.
+    Um get com versão diferente conta como miss, então escritas feitas por
+    outro worker também invalidam a entrada.
+    """
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[int, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, product_id: int, version: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(product_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._data.move_to_end(product_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, product_id: int, version: int, payload: Any) -> None:
+        with self._lock:
+            self._data[product_id] = (version, payload)
+            self._data.move_to_end(product_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, product_id: int) -> None:
+        with self._lock:
+            self._data.pop(product_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Instância compartilhada pelo catálogo, detalhe de produto e pedidos
+product_cache = ProductCache(maxsize=int(os.environ.get("PRODUCT_CACHE_SIZE", 2048)))
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Script para reconstruir as tabelas de resumo de vendas (daily_sales e daily_product_sales)
+a partir dos pedidos gravados. Usar depois de editar ou importar pedidos direto no banco.
+Uso: python -m backend.reconstruir_resumo_vendas
+"""
+
+import time
+
+from backend.database import SessionLocal
+from backend.models import DailySales, DailyProductSales
+import backend.main  # noqa: F401  (migrações de inicialização: colunas e totais dos pedidos)
+from backend import sales_rollup
+
+
+def main():
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        sales_rollup.rebuild(db)
+        days = db.query(DailySales).count()
+        rows = db.query(DailyProductSales).count()
+    finally:
+        db.close()
+    print(f"✅ Resumo reconstruído: {days} dias, {rows} linhas por produto em {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
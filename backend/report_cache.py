@@ -0,0 +1,99 @@
+"""
+Cache dos Relatórios do Admin - SwiftShop
+Resultado de /admin/reports guardado por janela (days). Vencido o TTL, a
+requisição recebe o valor anterior enquanto um único thread recalcula em
+segundo plano (stale-while-revalidate)
+"""
+from typing import Any, Callable, Dict, Hashable, Set, Tuple
+import os
+import threading
+import time
+
+
+class ReportCache:
+    """
+    ttl: idade até a qual o valor é servido sem recalcular.
+    max_stale: idade a partir da qual o valor é velho demais até para servir
+    enquanto recalcula; a requisição espera o cálculo.
+    Cálculos da mesma chave nunca rodam em paralelo (single-flight)
+    """
+
+    def __init__(self, ttl: float = 30.0, max_stale: float = 600.0):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        # chave -> (time.monotonic() do cálculo, valor)
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._refreshing: Set[Hashable] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _compute(self, key: Hashable, compute: Callable[[], Any], started: float) -> Any:
+        # Chamar com o lock da chave: quem esperava reaproveita o resultado do cálculo que terminou
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is not None and entry[0] >= started:
+            return entry[1]
+        value = compute()
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+        return value
+
+    def _refresh(self, key: Hashable, compute: Callable[[], Any]) -> None:
+        try:
+            with self._key_lock(key):
+                self._compute(key, compute, time.monotonic())
+        except Exception:
+            # Mantém o valor antigo; a próxima requisição tenta de novo
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key: Hashable, compute: Callable[[], Any], fresh: bool = False) -> Any:
+        """
+        Valor em cache para a chave. compute não recebe argumentos e deve abrir a
+        própria sessão do banco, porque pode rodar num thread em segundo plano
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = None if fresh else self._data.get(key)
+            age = now - entry[0] if entry is not None else None
+            if age is not None and age < self.ttl:
+                self.hits += 1
+                return entry[1]
+            if age is not None and age < self.max_stale:
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key, compute), daemon=True).start()
+                return entry[1]
+            self.misses += 1
+        with self._key_lock(key):
+            return self._compute(key, compute, now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+            }
+
+
+report_cache = ReportCache(
+    ttl=float(os.environ.get("REPORTS_CACHE_TTL", 30)),
+    max_stale=float(os.environ.get("REPORTS_CACHE_MAX_STALE", 600)),
+)
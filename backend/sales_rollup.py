@@ -0,0 +1,79 @@
+"""
+Resumo de Vendas por Dia - SwiftShop
+Tabelas daily_sales e daily_product_sales, atualizadas na mesma transação que
+cria ou remove o pedido: o relatório lê uma linha por dia em vez de varrer
+todos os pedidos e itens
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.models import DailyProductSales, DailySales, Order, OrderItem
+
+# (product_id, quantidade, preço unitário)
+OrderLine = Tuple[int, int, float]
+
+
+def _upsert(db: Session, model, keys: Dict, deltas: Dict):
+    """INSERT ... ON CONFLICT DO UPDATE somando os deltas: atômico mesmo com pedidos simultâneos"""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(model).values(**keys, **deltas)
+    return stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: getattr(model, name) + stmt.excluded[name] for name in deltas},
+    )
+
+
+def record_order(db: Session, created_at: datetime, lines: Iterable[OrderLine], sign: int = 1) -> None:
+    """
+    Soma (sign=1, pedido criado) ou subtrai (sign=-1, pedido removido) um pedido
+    dos totais do dia dele. Não faz commit: roda na transação de quem chamou
+    """
+    day = created_at.date()
+    per_product: Dict[int, List] = defaultdict(lambda: [0, 0.0])
+    for product_id, quantity, unit_price in lines:
+        per_product[product_id][0] += quantity
+        per_product[product_id][1] += unit_price * quantity
+    db.execute(_upsert(db, DailySales, {"day": day}, {
+        "orders": sign,
+        "items": sign * sum(q for q, _ in per_product.values()),
+        "revenue": sign * sum(r for _, r in per_product.values()),
+    }))
+    # A linha do dia em daily_sales, gravada acima, já enfileira os pedidos do mesmo dia; as linhas
+    # (dia, produto) vêm em product_id crescente para não depender da ordem dos itens no pedido
+    for product_id in sorted(per_product):
+        quantity, revenue = per_product[product_id]
+        db.execute(_upsert(db, DailyProductSales, {"day": day, "product_id": product_id}, {
+            "quantity": sign * quantity,
+            "revenue": sign * revenue,
+        }))
+
+
+def rebuild(db: Session) -> None:
+    """Recalcula as duas tabelas a partir de pedidos e itens (ex: depois de editar pedidos direto no banco)"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Pedidos criados durante o rebuild esperam o lock e somam depois, sem se perder nem contar duas vezes
+        db.execute(text("LOCK TABLE daily_sales, daily_product_sales IN EXCLUSIVE MODE"))
+    db.execute(delete(DailySales))
+    db.execute(delete(DailyProductSales))
+    day = func.date(Order.created_at)
+    db.execute(insert(DailySales).from_select(
+        ["day", "orders", "items", "revenue"],
+        select(day, func.count(Order.id), func.sum(Order.item_count), func.sum(Order.subtotal)).group_by(day),
+    ))
+    db.execute(insert(DailyProductSales).from_select(
+        ["day", "product_id", "quantity", "revenue"],
+        select(day, OrderItem.product_id, func.sum(OrderItem.quantity), func.sum(OrderItem.unit_price * OrderItem.quantity))
+        .join(Order, Order.id == OrderItem.order_id)
+        .group_by(day, OrderItem.product_id),
+    ))
+    db.commit()
+
+
+def since(days: int) -> date:
+    """Primeiro dia da janela do relatório (mesmo corte que date('now', '-N day'))"""
+    return datetime.utcnow().date() - timedelta(days=days)
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
+import unicodedata
 from backend.models import UserRole, OrderStatus
 
 
@@ -78,6 +79,7 @@ class ProductBase(BaseModel):
 	main_category: Optional[str] = None
 	sub_category: Optional[str] = None
 	attributes: Optional[Dict[str, Any]] = None
+	sku: Optional[str] = None
 
 
 class ProductCreate(ProductBase):
@@ -98,6 +100,7 @@ class ProductUpdate(BaseModel):
 	main_category: Optional[str] = None
 	sub_category: Optional[str] = None
 	attributes: Optional[Dict[str, Any]] = None
+	sku: Optional[str] = None
 
 
 class ProductOut(ProductBase):
@@ -107,6 +110,39 @@ class ProductOut(ProductBase):
 		from_attributes = True
 
 
+class ProductCard(BaseModel):
+	"""Projeção compacta (view=card) com o necessário para o ProductCard do app"""
+	id: int
+	name: str
+	price: float
+	image_url: Optional[str] = None  # primeira imagem do produto
+	stock: int = 0
+
+
+class ProductBatch(BaseModel):
+	"""Resultado de /products/batch: itens na ordem pedida e ids inexistentes"""
+	items: List[Union[ProductOut, ProductCard]]
+	missing: List[int] = []
+
+
+class ProductPage(BaseModel):
+	"""Página do catálogo; next_cursor é None na última página"""
+	items: List[Union[ProductOut, ProductCard, Dict[str, Any]]]
+	next_cursor: Optional[str] = None
+
+
+class ProductImportError(BaseModel):
+	row: int  # linha do arquivo (no CSV, o cabeçalho é a linha 1)
+	sku: Optional[str] = None
+	errors: List[str]
+
+
+class ProductImportResult(BaseModel):
+	created: int = 0
+	updated: int = 0
+	errors: List[ProductImportError] = []
+
+
 # Allowed attributes by main/sub category
 ALLOWED_ATTRS: Dict[str, Dict[str, List[str]]] = {
     "Vestuário": {
@@ -123,6 +159,16 @@ ALLOWED_ATTRS: Dict[str, Dict[str, List[str]]] = {
 }
 
 
+# Atributos exibidos como filtros (facetas); rating e preço promocional são numéricos
+FACET_ATTRS: List[str] = list(dict.fromkeys(
+    key
+    for subs in ALLOWED_ATTRS.values()
+    for keys in subs.values()
+    for key in keys
+    if key not in ("rating", "preco_promocional")
+))
+
+
 def sanitize_attributes(main_category: Optional[str], sub_category: Optional[str], attrs: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     if not attrs:
         return None
@@ -141,9 +187,47 @@ def sanitize_attributes(main_category: Optional[str], sub_category: Optional[str
     return filtered or None
 
 
+def fold_text(value: Optional[str]) -> Optional[str]:
+    """Minúsculas sem acentos (NFD sem marcas combinantes); None continua None"""
+    if value is None:
+        return None
+    n = unicodedata.normalize('NFD', value)
+    return ''.join(ch for ch in n if unicodedata.category(ch) != 'Mn').lower()
+
+
+def attribute_pairs(attrs: Optional[Dict[str, Any]]) -> List[tuple]:
+    """
+    (chave, valor, valor normalizado) de atributos já sanitizados, para a
+    tabela product_attributes; image_urls e valores não primitivos ficam de fora
+    """
+    if not attrs:
+        return []
+    pairs = []
+    for key, value in attrs.items():
+        if key == "image_urls" or isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            continue
+        text_value = str(value).strip()
+        if text_value:
+            pairs.append((key, text_value, fold_text(text_value)))
+    return pairs
+
+
+class FacetValue(BaseModel):
+	value: str
+	count: int
+
+
+class ProductFacets(BaseModel):
+	main_categories: List[FacetValue]
+	sub_categories: List[FacetValue]
+	attributes: Dict[str, List[FacetValue]]
+
+
 class OrderItemCreate(BaseModel):
 	product_id: int
-	quantity: int = 1
+	quantity: int = Field(1, ge=1)
+	size: Optional[str] = None
+	color: Optional[str] = None
 
 
 class OrderItemOut(BaseModel):
@@ -151,7 +235,9 @@ class OrderItemOut(BaseModel):
 	product_id: int
 	quantity: int
 	unit_price: float
-	product: ProductOut
+	size: Optional[str] = None
+	color: Optional[str] = None
+	product: Union[ProductOut, ProductCard]
 
 	class Config:
 		from_attributes = True
@@ -166,12 +252,22 @@ class OrderOut(BaseModel):
 	user_id: int
 	status: OrderStatus
 	created_at: datetime
+	subtotal: float = 0.0
+	shipping_cost: float = 0.0
+	total: float = 0.0
+	item_count: int = 0
 	items: List[OrderItemOut]
 
 	class Config:
 		from_attributes = True
 
 
+class OrderPage(BaseModel):
+	"""Página de pedidos (mais recentes primeiro); next_cursor é None na última página"""
+	items: List[OrderOut]
+	next_cursor: Optional[str] = None
+
+
 class ReviewCreate(BaseModel):
     rating: int = Field(ge=1, le=5)
     comment: Optional[str] = None
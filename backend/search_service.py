@@ -0,0 +1,157 @@
+"""
+Serviço de Busca de Produtos - SwiftShop
+Índice full-text (SQLite FTS5) sobre nome, descrição, categorias e atributos
+"""
+from sqlalchemy import text, literal_column, table, column, bindparam
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from typing import Iterable, Optional
+import json
+import logging
+import re
+
+from backend.models import Product
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "products_fts"
+
+# Pesos do bm25 por coluna: name, description, category, attributes
+RANK_EXPR = literal_column(f"bm25({FTS_TABLE}, 10.0, 1.0, 4.0, 6.0)")
+
+_fts = table(FTS_TABLE, column("rowid"))
+
+# Ativado em setup() quando o banco é SQLite com FTS5 disponível
+enabled = False
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def setup(engine: Engine) -> bool:
+    """
+    Cria a tabela FTS5 (se preciso) e reconstrói o índice quando está
+    dessincronizado com a tabela de produtos
+    """
+    global enabled
+    if engine.dialect.name != "sqlite":
+        enabled = False
+        return enabled
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "name, description, category, attributes, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            ))
+            indexed = conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar() or 0
+            total = conn.execute(text("SELECT count(*) FROM products")).scalar() or 0
+            if indexed != total:
+                _rebuild(conn)
+        enabled = True
+    except Exception as e:
+        logger.warning(f"FTS5 indisponível, busca usará LIKE: {e}")
+        enabled = False
+    return enabled
+
+
+def _rebuild(conn) -> None:
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    rows = conn.execute(text(
+        "SELECT id, name, description, category, main_category, sub_category, attributes_json FROM products"
+    )).all()
+    if rows:
+        conn.execute(
+            text(f"INSERT INTO {FTS_TABLE}(rowid, name, description, category, attributes) "
+                 "VALUES (:id, :name, :description, :category, :attributes)"),
+            [_document(r) for r in rows],
+        )
+
+
+def _document(p) -> dict:
+    """Monta as colunas indexadas a partir de um Product (ou linha equivalente)"""
+    categories = " ".join(c for c in (p.category, p.main_category, p.sub_category) if c)
+    attributes = ""
+    if p.attributes_json:
+        try:
+            attrs = json.loads(p.attributes_json)
+            if isinstance(attrs, dict):
+                attributes = " ".join(
+                    str(v) for k, v in attrs.items()
+                    if k != "image_urls" and isinstance(v, (str, int, float))
+                )
+        except Exception:
+            attributes = ""
+    return {
+        "id": p.id,
+        "name": p.name or "",
+        "description": p.description or "",
+        "category": categories,
+        "attributes": attributes,
+    }
+
+
+def index_product(db: Session, product: Product) -> None:
+    """Atualiza o documento do produto na mesma transação da escrita"""
+    if not enabled:
+        return
+    db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": product.id})
+    db.execute(
+        text(f"INSERT INTO {FTS_TABLE}(rowid, name, description, category, attributes) "
+             "VALUES (:id, :name, :description, :category, :attributes)"),
+        _document(product),
+    )
+
+
+def index_products(db: Session, product_ids: Iterable[int]) -> None:
+    """Reindexa vários produtos com um DELETE e um INSERT em lote (importação)"""
+    ids = list(product_ids)
+    if not enabled or not ids:
+        return
+    db.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids},
+    )
+    rows = db.execute(
+        text("SELECT id, name, description, category, main_category, sub_category, attributes_json "
+             "FROM products WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids},
+    ).all()
+    if rows:
+        db.execute(
+            text(f"INSERT INTO {FTS_TABLE}(rowid, name, description, category, attributes) "
+                 "VALUES (:id, :name, :description, :category, :attributes)"),
+            [_document(r) for r in rows],
+        )
+
+
+def remove_product(db: Session, product_id: int) -> None:
+    if not enabled:
+        return
+    db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": product_id})
+
+
+def match_expression(q: str) -> Optional[str]:
+    """
+    Converte o texto digitado numa expressão MATCH: cada termo vira um
+    prefixo entre aspas ("nik"*), combinados com AND
+    """
+    tokens = _TOKEN_RE.findall(q or "")
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def apply_search(query, q: str, ranked: bool = False):
+    """
+    Restringe a query de produtos aos que casam com q. Com ranked=True
+    ordena por relevância (bm25). Sem FTS5 cai no LIKE sobre o nome.
+    """
+    match = match_expression(q)
+    if not enabled or match is None:
+        return query.filter(Product.name.ilike(f"%{q}%"))
+    query = query.join(_fts, _fts.c.rowid == Product.id).filter(
+        text(f"{FTS_TABLE} MATCH :fts_match").bindparams(fts_match=match)
+    )
+    if ranked:
+        query = query.order_by(RANK_EXPR)
+    return query
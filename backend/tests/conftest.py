@@ -0,0 +1,82 @@
+"""
+Fixtures dos testes do backend
+Rodar a partir da raiz do repositório: python -m pytest backend/tests
+O banco é um SQLite temporário; DATABASE_URL precisa estar definido antes de importar o app
+"""
+import os
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix="swiftshop-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/test.db"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.auth import create_access_token, get_password_hash
+from backend.compression import body_cache
+from backend.database import SessionLocal
+from backend.main import app
+from backend.models import User, UserRole
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _user_headers(email: str, role: UserRole) -> dict:
+    session = SessionLocal()
+    try:
+        user = session.query(User).filter(User.email == email).first()
+        if user is None:
+            user = User(name=email.split("@")[0], email=email, password_hash=get_password_hash("x"), role=role)
+            session.add(user)
+            session.commit()
+        token = create_access_token({"sub": str(user.id), "role": role.value})
+    finally:
+        session.close()
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def admin_headers():
+    return _user_headers("admin@teste.com", UserRole.admin)
+
+
+@pytest.fixture(scope="session")
+def client_headers():
+    return _user_headers("cliente@teste.com", UserRole.client)
+
+
+@pytest.fixture(scope="module")
+def catalog(request, client, admin_headers):
+    """
+    Cria pela API os produtos da lista CATALOG do módulo de teste e os remove no fim do módulo.
+    Usar com pytestmark = pytest.mark.usefixtures("catalog") ou pedindo os ids
+    """
+    ids = []
+    for product in request.module.CATALOG:
+        r = client.post("/products", json=product, headers=admin_headers)
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["id"])
+    yield ids
+    for product_id in ids:
+        client.delete(f"/products/{product_id}", headers=admin_headers)
+
+
+@pytest.fixture
+def uncached_get(client):
+    """GET que sempre chega ao handler: o cache de respostas comprimidas usa só o ETag como chave"""
+    def get(url: str, **kwargs):
+        body_cache.clear()
+        return client.get(url, **kwargs)
+    return get
@@ -0,0 +1,27 @@
+"""O export precisa começar a transmitir logo, sem juntar centenas de linhas antes do primeiro bloco"""
+import pytest
+
+from backend import main
+
+CATALOG = [{"name": f"Exportado {i}", "price": 5.0 + i, "stock": i} for i in range(main.EXPORT_FLUSH_ROWS + 5)]
+pytestmark = pytest.mark.usefixtures("catalog")
+
+
+def test_csv_header_is_the_first_chunk():
+    chunks = main._export_catalog("csv")
+    assert next(chunks).strip() == ",".join(main.EXPORT_CSV_COLUMNS)
+    chunks.close()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_rows_are_flushed_in_small_blocks(fmt):
+    chunks = list(main._export_catalog(fmt))
+    rows = [chunk.count("\n") for chunk in chunks[1 if fmt == "csv" else 0:]]
+    assert max(rows) <= main.EXPORT_FLUSH_ROWS
+    assert sum(rows) >= len(CATALOG)
+
+
+def test_export_endpoint_streams_everything(client, admin_headers):
+    r = client.get("/products/export", params={"format": "csv"}, headers=admin_headers)
+    assert r.status_code == 200
+    assert all(p["name"] in r.text for p in CATALOG)
@@ -0,0 +1,50 @@
+"""As contagens de /products/facets precisam bater com o que a listagem devolve para o mesmo filtro"""
+import pytest
+from sqlalchemy import event
+
+from backend.database import engine
+
+CATALOG = [
+    {"name": "Camisa Polo", "price": 100.0, "stock": 2, "main_category": "Vestuário", "sub_category": "Camisas"},
+    # Sem main_category mas com sub_category: a listagem mostra em Vestuário
+    {"name": "Camisa Linho", "price": 150.0, "stock": 1, "sub_category": "Camisas"},
+    {"name": "Sandália", "price": 80.0, "stock": 3, "main_category": "Calçados", "sub_category": "Sandálias"},
+    {"name": "Chaveiro", "price": 15.0, "stock": 9},
+]
+pytestmark = pytest.mark.usefixtures("catalog")
+
+
+def _counts(facets: list) -> dict:
+    return {f["value"]: f["count"] for f in facets}
+
+
+def test_main_category_counts_match_listing(uncached_get):
+    counts = _counts(uncached_get("/products/facets").json()["main_categories"])
+
+    for value, count in counts.items():
+        listed = uncached_get("/products", params={"main_category": value}).json()
+        assert len(listed) == count, value
+    assert counts["Vestuário"] == 2
+
+
+def test_query_is_normalised_once(uncached_get):
+    plain = uncached_get("/products/facets", params={"q": "camisa"}).json()
+    padded = uncached_get("/products/facets", params={"q": "  camisa  "}).json()
+
+    assert padded == plain
+    assert _counts(plain["main_categories"]) == {"Vestuário": 2}
+
+
+def test_catalog_version_read_once(uncached_get):
+    reads = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM app_counters" in statement:
+            reads.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        assert uncached_get("/products/facets", params={"q": "linho"}).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert len(reads) == 1
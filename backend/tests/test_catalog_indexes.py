@@ -0,0 +1,72 @@
+"""
+Cada combinação de filtro e ordenação do catálogo precisa de um índice que já
+entregue as linhas na ordem pedida: sem "USE TEMP B-TREE FOR ORDER BY", uma
+página por cursor lê só as linhas da página em vez de ordenar a categoria inteira
+"""
+import itertools
+
+import pytest
+from sqlalchemy import event
+
+from backend.database import engine
+
+FILTERS = [
+    {},
+    {"main_category": "Calçados"},
+    {"main_category": "Vestuário"},
+    {"sub_category": "Camisas"},
+    {"main_category": "Calçados", "sub_category": "Sapatos"},
+    {"main_category": "Vestuário", "sub_category": "Camisas"},
+]
+SORTS = ["name", "price", "-price", "newest", "rating"]
+
+CATALOG = [
+    {
+        "name": f"Produto {i}", "price": 10.0 + i, "stock": i % 2,
+        "main_category": ["Vestuário", "Calçados", None][i % 3], "sub_category": ["Camisas", "Sapatos"][i % 2],
+    }
+    for i in range(6)
+]
+pytestmark = pytest.mark.usefixtures("catalog")
+
+
+def _catalog_plans(uncached_get, params: dict) -> list:
+    """Plano (EXPLAIN QUERY PLAN) de cada SELECT de produtos que GET /products executou"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "FROM products" in statement and "LIMIT" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        r = uncached_get("/products", params=params)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert r.status_code == 200, r.text
+    assert statements, "nenhuma consulta de produtos capturada"
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            plans.append([row[3] for row in rows])
+    return plans
+
+
+def _first_cursor(uncached_get, params: dict):
+    return uncached_get("/products", params={**params, "limit": 1}).json().get("next_cursor")
+
+
+@pytest.mark.parametrize("filters,sort,in_stock", list(itertools.product(FILTERS, SORTS, [False, True])))
+def test_catalog_page_uses_index_order(uncached_get, filters, sort, in_stock):
+    params = {**filters, "sort": sort, "limit": 20}
+    if in_stock:
+        params["in_stock"] = "true"
+    cursor = _first_cursor(uncached_get, params)
+    for page_params in [params] + ([{**params, "cursor": cursor}] if cursor else []):
+        for plan in _catalog_plans(uncached_get, page_params):
+            details = " | ".join(plan)
+            assert "TEMP B-TREE" not in details, details
+            # Percorrer a tabela inteira só é aceitável sem nenhum filtro (sort=newest puro segue o id)
+            if filters or in_stock:
+                assert "SCAN products" not in [step.strip() for step in plan], details
@@ -0,0 +1,135 @@
+"""O snapshot em memória precisa devolver exatamente o mesmo que a consulta no banco"""
+import itertools
+
+import pytest
+
+from backend import catalog_snapshot
+
+CATALOG = [
+    {"name": "Camisa Azul", "price": 120.0, "stock": 3, "main_category": "Vestuário", "sub_category": "Camisas"},
+    {"name": "camisa branca", "price": 80.0, "stock": 0, "main_category": "Vestuario", "sub_category": "Camisas"},
+    {"name": "Calça Jeans", "price": 250.0, "stock": 7, "main_category": "Vestuário", "sub_category": "Calças"},
+    # Sem main_category (NULL) mas com sub_category: entra em Vestuário
+    {"name": "Vestido Floral", "price": 300.0, "stock": 2, "sub_category": "Vestidos"},
+    # main_category vazio não é NULL: fica fora de Vestuário, como no filtro SQL
+    {"name": "Saia Curta", "price": 90.0, "stock": 4, "main_category": "", "sub_category": "Saias"},
+    {"name": "Sapato Social", "price": 400.0, "stock": 1, "main_category": "Calçados", "sub_category": "Sapatos"},
+    {"name": "Ténis Corrida", "price": 350.0, "stock": 0, "main_category": "Calçados", "sub_category": "Ténis"},
+    {"name": "Relógio", "price": 120.0, "stock": 5, "main_category": "Acessórios"},
+    {"name": "Boné", "price": 45.0, "stock": 9},
+    {"name": "Camisa Azul", "price": 120.0, "stock": 1, "main_category": "Vestuário", "sub_category": "Camisas"},
+]
+
+FILTERS = [
+    {},
+    {"main_category": "Vestuário"},
+    {"main_category": "vestuario"},
+    {"main_category": "Calçados"},
+    {"main_category": "Acessórios", "in_stock": "true"},
+    {"sub_category": "Camisas"},
+    {"sub_category": "Saias"},
+    {"main_category": "Vestuário", "sub_category": "camisas", "min_price": 100},
+    {"min_price": 90, "max_price": 300},
+    {"in_stock": "true"},
+]
+SORTS = ["", "name", "price", "-price", "newest", "rating"]
+pytestmark = pytest.mark.usefixtures("catalog")
+
+
+def _fetch(uncached_get, params: dict, use_snapshot: bool, monkeypatch) -> list:
+    """Todas as páginas (ou a lista completa sem limit) pelo caminho escolhido"""
+    monkeypatch.setattr(catalog_snapshot, "enabled", use_snapshot)
+    monkeypatch.setattr(catalog_snapshot, "MODE", "shared" if use_snapshot else "")
+    # Mesmo ETag nos dois caminhos: sem uncached_get, a segunda chamada viria do cache de respostas
+    if "limit" not in params:
+        r = uncached_get("/products", params=params)
+        assert r.status_code == 200, r.text
+        return r.json()
+    items, cursor = [], None
+    while True:
+        r = uncached_get("/products", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200, r.text
+        page = r.json()
+        items.extend(page["items"])
+        cursor = page.get("next_cursor")
+        if not cursor:
+            return items
+
+
+@pytest.mark.parametrize("filters,sort", list(itertools.product(FILTERS, SORTS)))
+@pytest.mark.parametrize("paged", [False, True])
+def test_snapshot_matches_sql(uncached_get, monkeypatch, filters, sort, paged):
+    params = dict(filters)
+    if sort:
+        params["sort"] = sort
+    if paged:
+        params.update(limit=3, view="card")
+    catalog_snapshot.invalidate()
+    from_sql = _fetch(uncached_get, params, use_snapshot=False, monkeypatch=monkeypatch)
+    from_snapshot = _fetch(uncached_get, params, use_snapshot=True, monkeypatch=monkeypatch)
+    assert catalog_snapshot.stats()["version"] is not None, "a leitura não passou pelo snapshot"
+    assert from_snapshot == from_sql
+
+
+def test_empty_main_category_is_not_vestuario(uncached_get, monkeypatch):
+    catalog_snapshot.invalidate()
+    names = {p["name"] for p in _fetch(uncached_get, {"main_category": "Vestuário"}, True, monkeypatch)}
+    assert "Vestido Floral" in names
+    assert "Saia Curta" not in names
+
+
+def _entry(product_id: int, **fields) -> catalog_snapshot.SnapshotEntry:
+    values = dict(
+        id=product_id, version=1, name=f"Produto {product_id % 7}", price=float(product_id % 5), stock=product_id % 3,
+        rating_avg=float(product_id % 4), main_category_norm=[None, "vestuario", "calcados", ""][product_id % 4],
+        sub_category_norm=[None, "camisas"][product_id % 2], out=None, card=None,
+    )
+    values.update(fields)
+    return catalog_snapshot.SnapshotEntry(**values)
+
+
+def _all_orderings(snap) -> dict:
+    return {
+        (sort, main): [e.id for e in snap.select(sort=sort, main_category=main)]
+        for sort in catalog_snapshot.SORTS for main in (None, "vestuario", "calcados", "nova")
+    }
+
+
+def test_incremental_replace_matches_full_build():
+    entries = {i: _entry(i) for i in range(1, 60)}
+    snap = catalog_snapshot.CatalogSnapshot(1, entries.values())
+    changes = [
+        ([_entry(3, price=99.0), _entry(8, main_category_norm="nova"), _entry(100)], [5, 12]),
+        ([_entry(9, name="AAA", rating_avg=3.5), _entry(10, main_category_norm=None, sub_category_norm=None)], []),
+        ([_entry(12), _entry(3, stock=0)], [100, 999]),
+    ]
+    for version, (upserts, removed) in enumerate(changes, start=2):
+        snap = snap.replace(version, upserts, removed)
+        for product_id in removed:
+            entries.pop(product_id, None)
+        entries.update({e.id: e for e in upserts})
+        assert _all_orderings(snap) == _all_orderings(catalog_snapshot.CatalogSnapshot(version, entries.values()))
+
+
+def test_stock_change_keeps_orderings():
+    snap = catalog_snapshot.CatalogSnapshot(1, [_entry(i) for i in range(1, 20)])
+    after = snap.replace(2, [_entry(4, stock=0, version=2)])
+    assert after.by_id[4].stock == 0
+    assert all(after._orderings[k] is snap._orderings[k] for k in snap._orderings)
+
+
+def test_shared_worker_catches_up_from_change_log(client, uncached_get, admin_headers, monkeypatch):
+    monkeypatch.setattr(catalog_snapshot, "enabled", True)
+    monkeypatch.setattr(catalog_snapshot, "MODE", "shared")
+    catalog_snapshot.invalidate()
+    uncached_get("/products")
+    stale = catalog_snapshot._snapshot
+    product_id = client.post("/products", json={"name": "Gorro", "price": 30.0, "stock": 2}, headers=admin_headers).json()["id"]
+    try:
+        # Outro worker: ainda com o snapshot de antes da escrita, não pode recarregar o catálogo inteiro
+        monkeypatch.setattr(catalog_snapshot, "_snapshot", stale)
+        monkeypatch.setattr("backend.main._load_catalog_snapshot", lambda: pytest.fail("recarga completa"))
+        assert product_id in [p["id"] for p in uncached_get("/products").json()]
+        assert catalog_snapshot._snapshot.version > stale.version
+    finally:
+        client.delete(f"/products/{product_id}", headers=admin_headers)
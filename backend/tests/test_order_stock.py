@@ -0,0 +1,120 @@
+"""
+Pedidos simultâneos disputando o mesmo estoque: o UPDATE condicional de
+_reserve_stock tem que vender exatamente o que existe, nunca deixar negativo
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from backend.main import app
+from backend.models import Order, OrderItem, Product, ProductVariant
+
+PARALLEL_ORDERS = 300
+
+
+@pytest.fixture
+def new_product(client, db, admin_headers):
+    """Cria produtos direto no banco; no fim remove os pedidos que os usaram e os próprios produtos"""
+    created = []
+
+    def make(**fields) -> Product:
+        product = Product(**fields)
+        db.add(product)
+        db.commit()
+        created.append(product.id)
+        return product
+
+    yield make
+    db.rollback()
+    order_ids = [oid for (oid,) in db.query(OrderItem.order_id).filter(OrderItem.product_id.in_(created)).distinct()]
+    for order in db.query(Order).filter(Order.id.in_(order_ids)):
+        db.delete(order)
+    db.commit()
+    for product_id in created:
+        assert client.delete(f"/products/{product_id}", headers=admin_headers).status_code == 204
+
+
+def _place_concurrently(headers: dict, items: list, n: int) -> list:
+    """n POST /orders iguais disparados juntos no mesmo event loop; devolve os status"""
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            responses = await asyncio.gather(*[
+                ac.post("/orders", json={"items": items}, headers=headers) for _ in range(n)
+            ])
+        return [r.status_code for r in responses]
+    return asyncio.run(run())
+
+
+def _sold(db, product_id: int) -> int:
+    return sum(q for (q,) in db.query(OrderItem.quantity).filter(OrderItem.product_id == product_id))
+
+
+def test_parallel_orders_never_oversell(db, client_headers, new_product):
+    product = new_product(name="Último lote", price=100.0, stock=7)
+
+    statuses = _place_concurrently(client_headers, [{"product_id": product.id, "quantity": 1}], PARALLEL_ORDERS)
+
+    assert statuses.count(200) == 7, statuses
+    assert statuses.count(400) == PARALLEL_ORDERS - 7, statuses
+    db.expire_all()
+    assert db.get(Product, product.id).stock == 0
+    assert _sold(db, product.id) == 7
+    # Pedidos recusados não deixam pedido vazio para trás
+    assert db.query(Order).filter(~Order.items.any()).count() == 0
+
+
+def test_parallel_orders_never_oversell_a_size(db, client_headers, new_product):
+    product = new_product(
+        name="Ténis numerado", price=50.0, stock=400,
+        variants=[ProductVariant(size="40", stock=3), ProductVariant(size="41", stock=10)],
+    )
+
+    statuses = _place_concurrently(
+        client_headers, [{"product_id": product.id, "quantity": 1, "size": "40"}], PARALLEL_ORDERS,
+    )
+
+    assert statuses.count(200) == 3, statuses
+    assert statuses.count(400) == PARALLEL_ORDERS - 3, statuses
+    db.expire_all()
+    stock = {v.size: v.stock for v in db.get(Product, product.id).variants}
+    assert stock == {"40": 0, "41": 10}
+    # O estoque total do produto baixa só pelos pedidos aceitos
+    assert db.get(Product, product.id).stock == 397
+    assert _sold(db, product.id) == 3
+
+
+def test_order_with_size_the_app_sends(client, db, client_headers, new_product):
+    # Como o produto 1 do banco de exemplo: attributes.tamanho="43", mas variantes 38/41/42
+    product = new_product(
+        name="Sapato com variantes", price=80.0, stock=10, attributes_json='{"tamanho": "43"}',
+        variants=[ProductVariant(size="38", stock=0), ProductVariant(size="41", stock=2), ProductVariant(size="42", stock=1)],
+    )
+
+    size_stock = client.get(f"/products/{product.id}").json()["size_stock"]
+    # O app oferece as variantes e pré-seleciona a primeira com estoque
+    size = next(s for s, stock in size_stock.items() if stock > 0)
+    assert size == "41"
+    r = client.post("/orders", json={"items": [{"product_id": product.id, "quantity": 1, "size": size}]}, headers=client_headers)
+    assert r.status_code == 200, r.text
+
+    # Tamanho sem linha de variante (versões antigas do app) vende do estoque do produto
+    r = client.post("/orders", json={"items": [{"product_id": product.id, "quantity": 1, "size": "43"}]}, headers=client_headers)
+    assert r.status_code == 200, r.text
+
+    db.expire_all()
+    product = db.get(Product, product.id)
+    assert {v.size: v.stock for v in product.variants} == {"38": 0, "41": 1, "42": 1}
+    assert product.stock == 8
+
+
+@pytest.mark.parametrize("quantity", [0, -3])
+def test_order_quantity_must_be_positive(client, db, client_headers, new_product, quantity):
+    product = new_product(name="Quantidade inválida", price=10.0, stock=5)
+
+    r = client.post("/orders", json={"items": [{"product_id": product.id, "quantity": quantity}]}, headers=client_headers)
+
+    assert r.status_code == 422, r.text
+    db.expire_all()
+    assert db.get(Product, product.id).stock == 5
@@ -0,0 +1,144 @@
+"""
+Contagem de Visitas - SwiftShop
+Middleware que conta aberturas do catálogo e visualizações de produto em
+memória, num buffer por worker, e grava os totais agregados por
+(dia, produto) em lote a cada VISITS_FLUSH_SECONDS, em vez de uma escrita
+por requisição
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Optional
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.database import SessionLocal
+from backend.models import DailyVisits
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = float(os.environ.get("VISITS_FLUSH_SECONDS", 10))
+# product_id usado para as aberturas do catálogo (primeira página de GET /products)
+CATALOG = 0
+# 304 é o app revalidando o ETag de algo que está exibindo de novo: também conta
+COUNTED_STATUSES = (200, 304)
+
+_PRODUCT_PATH = re.compile(r"^/products/(\d+)$")
+
+
+def _write(db: Session, counts: Counter) -> None:
+    """Um único executemany de upserts somando as contagens"""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(DailyVisits)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "product_id"],
+        set_={"views": DailyVisits.views + stmt.excluded.views},
+    )
+    # Os flushes de vários workers (e o do atexit) podem cair juntos sobre as mesmas linhas (dia, produto)
+    # de daily_visits; com as chaves ordenadas, no Postgres todos travam essas linhas na mesma sequência
+    db.execute(stmt, [
+        {"day": day, "product_id": product_id, "views": views}
+        for (day, product_id), views in sorted(counts.items())
+    ])
+
+
+class VisitBuffer:
+    """
+    Contagens (dia UTC, product_id) -> visitas ainda não gravadas. O thread que
+    grava é iniciado na primeira contagem de cada processo, então cada worker
+    tem o seu buffer e scripts que só importam o app não abrem threads
+    """
+
+    def __init__(self, flush_seconds: float = 10.0):
+        self.flush_seconds = flush_seconds
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+
+    def record(self, product_id: int) -> None:
+        key = (datetime.utcnow().date(), product_id)
+        with self._lock:
+            self._counts[key] += 1
+            if self._pid != os.getpid():
+                # Primeira contagem neste processo (ou processo filho de um fork)
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True).start()
+                atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self) -> int:
+        """Grava o que está no buffer; numa falha as contagens voltam para a próxima tentativa"""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return 0
+        try:
+            with SessionLocal() as db:
+                _write(db, counts)
+                db.commit()
+        except Exception:
+            logger.exception("Falha ao gravar visitas; tentando de novo no próximo ciclo")
+            with self._lock:
+                self._counts.update(counts)
+                self.failed_flushes += 1
+            return 0
+        with self._lock:
+            self.flushed_rows += len(counts)
+        return len(counts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending_rows": len(self._counts),
+                "pending_views": sum(self._counts.values()),
+                "flushed_rows": self.flushed_rows,
+                "failed_flushes": self.failed_flushes,
+                "flush_seconds": self.flush_seconds,
+            }
+
+
+visit_buffer = VisitBuffer(flush_seconds=FLUSH_SECONDS)
+
+
+def _tracked_product(scope: Scope) -> Optional[int]:
+    """product_id contado pela requisição: CATALOG, o id do produto, ou None se não conta"""
+    if scope["method"] != "GET":
+        return None
+    path = scope["path"]
+    if path == "/products":
+        # Só a primeira página: rolar o catálogo não é uma visita nova
+        return None if b"cursor=" in scope.get("query_string", b"") else CATALOG
+    match = _PRODUCT_PATH.match(path)
+    return int(match.group(1)) if match else None
+
+
+class VisitTrackingMiddleware:
+    def __init__(self, app: ASGIApp, buffer: VisitBuffer = visit_buffer):
+        self.app = app
+        self.buffer = buffer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        product_id = _tracked_product(scope) if scope["type"] == "http" else None
+        if product_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] in COUNTED_STATUSES:
+                self.buffer.record(product_id)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -7,6 +7,8 @@ export interface Reports {
     visits_by_day: { date: string; visits?: number }[];
     order_statuses: Record<string, number>;
     top_products: { name: string; revenue: number }[];
+    top_viewed?: { name: string; views: number }[];
+    generated_at?: string;
 }
 
 export async function fetchReports(days: number = 30): Promise<Reports> {
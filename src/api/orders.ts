@@ -5,10 +5,12 @@ import * as Sharing from 'expo-sharing';
 import { Platform } from 'react-native';
 import AsyncStorage from '@react-native-async-storage/async-storage';
 
-export interface CreateOrderItem { product_id: number; quantity: number }
+export interface CreateOrderItem { product_id: number; quantity: number; size?: string; color?: string }
 
-export async function createOrder(items: CreateOrderItem[]): Promise<Order> {
-	const res = await api.post('/orders', { items });
+// idempotencyKey: reutilizar a mesma chave ao repetir um pedido que falhou por rede
+export async function createOrder(items: CreateOrderItem[], idempotencyKey?: string): Promise<Order> {
+	const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined;
+	const res = await api.post('/orders', { items }, { headers });
 	return res.data;
 }
 
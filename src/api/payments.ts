@@ -5,8 +5,10 @@ export async function createPaypalOrder(totalUSD: number): Promise<{ id: string;
     return res.data;
 }
 
-export async function capturePaypalOrder(orderId: string): Promise<any> {
-    const res = await api.post(`/payments/paypal/capture/${orderId}`);
+// idempotencyKey: a mesma chave ao repetir a captura da mesma ordem PayPal não cobra duas vezes
+export async function capturePaypalOrder(orderId: string, idempotencyKey?: string): Promise<any> {
+    const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined;
+    const res = await api.post(`/payments/paypal/capture/${orderId}`, null, { headers });
     return res.data;
 }
 
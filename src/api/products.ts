@@ -14,6 +14,22 @@ export async function getProduct(id: number): Promise<Product> {
 	return res.data;
 }
 
+export interface ProductBatch { items: Product[]; missing: number[] }
+
+// Limite de ids por requisição em /products/batch (PRODUCTS_BATCH_MAX no backend)
+const PRODUCTS_BATCH_MAX = 300;
+
+export async function getProductsBatch(ids: number[]): Promise<ProductBatch> {
+	const result: ProductBatch = { items: [], missing: [] };
+	for (let i = 0; i < ids.length; i += PRODUCTS_BATCH_MAX) {
+		const chunk = ids.slice(i, i + PRODUCTS_BATCH_MAX);
+		const res = await api.get('/products/batch', { params: { ids: chunk.join(',') } });
+		result.items.push(...res.data.items);
+		result.missing.push(...res.data.missing);
+	}
+	return result;
+}
+
 export interface ReviewInput { rating: number; comment?: string }
 export interface Review {
     id: number;
@@ -1,5 +1,6 @@
 import React, { createContext, useContext, useMemo, useState } from 'react';
 import { Product } from '../types';
+import { getProductsBatch } from '../api/products';
 
 export interface CartLine {
 	product: Product;
@@ -11,10 +12,13 @@ export interface CartLine {
 interface CartContextType {
 	lines: CartLine[];
 	subtotal: number;
+	// Itens do pedido (produto, quantidade, tamanho, cor): muda só quando o pedido enviado mudaria
+	signature: string;
 	addToCart: (product: Product, quantity?: number, size?: string, color?: string) => void;
 	removeFromCart: (productId: number, size?: string) => void;
 	setQuantity: (productId: number, quantity: number, size?: string) => void;
 	clearCart: () => void;
+	refreshProducts: () => Promise<void>;
 }
 
 const CartContext = createContext<CartContextType | undefined>(undefined);
@@ -63,9 +67,27 @@ export const CartProvider: React.FC<{ children: React.ReactNode }> = ({ children
 
 	const clearCart = () => setLines([]);
 
+	// Atualiza preço/estoque dos produtos do carrinho numa única requisição e tira os que foram removidos
+	const refreshProducts = async () => {
+		const ids = Array.from(new Set(lines.map((l) => l.product.id)));
+		if (ids.length === 0) return;
+		try {
+			const { items, missing } = await getProductsBatch(ids);
+			const fresh = new Map(items.map((p) => [p.id, p]));
+			setLines((prev) => prev
+				.filter((l) => !missing.includes(l.product.id))
+				.map((l) => (fresh.has(l.product.id) ? { ...l, product: fresh.get(l.product.id)! } : l)));
+		} catch {}
+	};
+
 	const subtotal = useMemo(() => lines.reduce((s, l) => s + l.product.price * l.quantity, 0), [lines]);
 
-	const value = useMemo(() => ({ lines, subtotal, addToCart, removeFromCart, setQuantity, clearCart }), [lines, subtotal]);
+	const signature = useMemo(
+		() => lines.map((l) => `${l.product.id}:${l.quantity}:${l.selectedSize ?? ''}:${l.selectedColor ?? ''}`).join('|'),
+		[lines],
+	);
+
+	const value = useMemo(() => ({ lines, subtotal, signature, addToCart, removeFromCart, setQuantity, clearCart, refreshProducts }), [lines, subtotal, signature]);
 	return <CartContext.Provider value={value}>{children}</CartContext.Provider>;
 };
 
@@ -7,6 +7,8 @@ interface FavoritesContextValue {
 	favorites: number[];
 	isFavorite: (productId: number) => boolean;
 	toggleFavorite: (productId: number) => void;
+	// Remove ids de produtos que não existem mais (o `missing` de /products/batch)
+	pruneFavorites: (productIds: number[]) => void;
 }
 
 const FavoritesContext = createContext<FavoritesContextValue | undefined>(undefined);
@@ -48,6 +50,13 @@ export function FavoritesProvider({ children }: { children: React.ReactNode }) {
 				return next;
 			});
 		},
+		pruneFavorites: (ids: number[]) => {
+			if (ids.length === 0) return;
+			setFavorites((prev) => prev.filter((x) => !ids.includes(x)));
+			if (token) {
+				ids.forEach((id) => removeFavorite(id).catch(() => {}));
+			}
+		},
 	}), [favorites, token]);
 
 	return <FavoritesContext.Provider value={value}>{children}</FavoritesContext.Provider>;
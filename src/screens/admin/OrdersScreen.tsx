@@ -81,7 +81,7 @@ export default function AdminOrdersScreen() {
 		return String(o.id).includes(q);
 	});
 
-	const sumOrder = (o: Order) => o.items.reduce((acc, it) => acc + it.unit_price * it.quantity, 0);
+	const sumOrder = (o: Order) => o.subtotal ?? o.items.reduce((acc, it) => acc + it.unit_price * it.quantity, 0);
 
 	const getStatusConfig = (status: OrderStatus) => {
 		const configs = {
@@ -8,18 +8,26 @@ import AnimatedButton from '../../components/AnimatedButton';
 import EmptyState from '../../components/EmptyState';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
+import { useIdempotencyKey } from '../../utils/idempotency';
 
 export default function CartScreen({ navigation }: any) {
-	const { lines, subtotal, setQuantity, removeFromCart, clearCart } = useCart();
+	const { lines, subtotal, signature, setQuantity, removeFromCart, clearCart, refreshProducts } = useCart();
 	const [coupon, setCoupon] = useState('');
 	const [appliedCoupon, setAppliedCoupon] = useState<string | null>(null);
 	const [isAnimating, setIsAnimating] = useState(false);
+	// Mesma chave enquanto o carrinho não muda: tocar duas vezes ou repetir após erro não duplica o pedido
+	const orderKey = useIdempotencyKey([signature]);
 	
 	// Animation refs
 	const fadeAnim = useRef(new Animated.Value(0)).current;
 	const slideAnim = useRef(new Animated.Value(50)).current;
 	const scaleAnim = useRef(new Animated.Value(0.95)).current;
 
+	// Preços e estoque podem ter mudado desde que os itens entraram no carrinho
+	useEffect(() => {
+		refreshProducts();
+	}, []);
+
 	useEffect(() => {
 		Animated.parallel([
 			Animated.timing(fadeAnim, {
@@ -85,7 +93,8 @@ export default function CartScreen({ navigation }: any) {
 	const checkout = async () => {
 		if (!lines.length) return;
 		try {
-			await createOrder(lines.map((l) => ({ product_id: l.product.id, quantity: l.quantity })));
+			await createOrder(lines.map((l) => ({ product_id: l.product.id, quantity: l.quantity, size: l.selectedSize, color: l.selectedColor })), orderKey.get());
+			orderKey.reset();
 			clearCart();
 			Alert.alert('Pedido', 'Pedido criado com sucesso!');
 		} catch (e: any) {
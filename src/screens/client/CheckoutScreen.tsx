@@ -8,15 +8,18 @@ import AnimatedScreen from '../../components/AnimatedScreen';
 import AnimatedCard from '../../components/AnimatedCard';
 import { Ionicons } from '@expo/vector-icons';
 import { createOrder } from '../../api/orders';
+import { useIdempotencyKey } from '../../utils/idempotency';
 
 type PaymentMethod = 'card' | 'mpesa' | 'emola' | 'paypal' | 'qr' | 'face';
 
 export default function CheckoutScreen({ navigation }: any) {
-    const { lines, subtotal, clearCart } = useCart();
+    const { lines, subtotal, signature, clearCart } = useCart();
     const auth = useAuth();
     const [method, setMethod] = useState<PaymentMethod>('card');
     const [card, setCard] = useState({ number: '', name: '', exp: '', cvv: '' });
     const [reference, setReference] = useState('');
+    // Uma chave por tentativa de checkout, reaproveitada nas retentativas enquanto o carrinho não muda
+    const checkoutKey = useIdempotencyKey([signature]);
 
     const shipping = useMemo(() => (subtotal >= 200 ? 0 : (lines.length ? 19.9 : 0)), [subtotal, lines.length]);
     const total = useMemo(() => subtotal + shipping, [subtotal, shipping]);
@@ -26,6 +29,7 @@ export default function CheckoutScreen({ navigation }: any) {
             Alert.alert('Carrinho', 'Seu carrinho está vazio.');
             return;
         }
+        const key = checkoutKey.get();
         if (method === 'paypal') {
             try {
                 // Conversão MZN->USD via taxa configurável
@@ -43,15 +47,19 @@ export default function CheckoutScreen({ navigation }: any) {
                             // @ts-ignore - remove is available in current RN
                             if (sub && typeof (sub as any).remove === 'function') (sub as any).remove();
                             try {
-                                await (await import('../../api/payments')).capturePaypalOrder(id);
+                                // A captura é por ordem PayPal: a chave leva o id para não colidir com outra ordem da mesma tentativa
+                                await (await import('../../api/payments')).capturePaypalOrder(id, `${key}-${id}`);
                                 
                                 // Criar pedido no backend
                                 const orderItems = lines.map(line => ({
                                     product_id: line.product.id,
-                                    quantity: line.quantity
+                                    quantity: line.quantity,
+                                    size: line.selectedSize,
+                                    color: line.selectedColor
                                 }));
                                 
-                                const order = await createOrder(orderItems);
+                                const order = await createOrder(orderItems, key);
+                                checkoutKey.reset();
                                 clearCart();
                                 
                                 Alert.alert(
@@ -84,12 +92,15 @@ export default function CheckoutScreen({ navigation }: any) {
         try {
             const orderItems = lines.map(line => ({
                 product_id: line.product.id,
-                quantity: line.quantity
+                quantity: line.quantity,
+                size: line.selectedSize,
+                color: line.selectedColor
             }));
             
             console.log('Criando pedido com items:', orderItems);
-            const order = await createOrder(orderItems);
+            const order = await createOrder(orderItems, key);
             console.log('Pedido criado:', order);
+            checkoutKey.reset();
             clearCart();
             
             Alert.alert(
@@ -123,7 +123,14 @@ useEffect(() => {
 
 	const sizeOptions = useMemo(() => {
 		if (!item) return [] as string[];
-		// 1) Buscar em atributos usando chaves comuns
+		// 1) Tamanhos cadastrados como variantes (são os que o backend valida e baixa por tamanho)
+		const variantSizes = Array.from(new Set([
+			...Object.keys(item.size_stock || {}),
+			...Object.keys(item.size_colors || {}),
+			...Object.keys(item.size_images || {}),
+		]));
+		if (variantSizes.length) return variantSizes;
+		// 2) Buscar em atributos usando chaves comuns
 		const attrs: any = item.attributes || {};
 		const raw = (attrs.tamanho ?? attrs.size ?? attrs.sizes) as unknown;
 		if (Array.isArray(raw)) return raw.map((v) => String(v));
@@ -141,7 +148,7 @@ useEffect(() => {
 			if (csv.length === 1) return csv; // único valor
 		}
 		if (typeof raw === 'number') return [String(raw)];
-		// 2) Defaults por subcategoria (normalizada, sem acento)
+		// 3) Defaults por subcategoria (normalizada, sem acento)
 		const norm = (s?: string | null) => (s || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase();
 		switch (norm(item.sub_category)) {
 			case 'sapato':
@@ -162,10 +169,12 @@ useEffect(() => {
 	}, [item]);
 
 	useEffect(() => {
-		if (sizeOptions.length && !size) {
-			setSize(sizeOptions[0]);
+		if (sizeOptions.length && !sizeOptions.includes(size)) {
+			// Pré-seleciona o primeiro tamanho com estoque (sem estoque por tamanho, o primeiro da lista)
+			const stock = item?.size_stock || {};
+			setSize(sizeOptions.find((s) => stock[s] === undefined || stock[s] === null || stock[s] > 0) || sizeOptions[0]);
 		}
-	}, [sizeOptions.length]);
+	}, [sizeOptions]);
 
 	const SizeChip = ({ value, selected, onPress }: { value: string; selected: boolean; onPress: () => void }) => {
 		const isClothing = CLOTHING_CATEGORIES.includes(item?.sub_category || '');
@@ -8,7 +8,7 @@ import { Ionicons } from '@expo/vector-icons';
 import { useFavorites } from '../../contexts/FavoritesContext';
 import { useNavigation } from '@react-navigation/native';
 import { useEffect, useState } from 'react';
-import { getProduct } from '../../api/products';
+import { getProductsBatch } from '../../api/products';
 import { Product, Order } from '../../types';
 import ProductCard from '../../components/ProductCard';
 import * as ImagePicker from 'expo-image-picker';
@@ -19,18 +19,19 @@ import { getFullImageUrl } from '../../utils/imageUtils';
 
 export default function ProfileScreen() {
 	const { name, email, role, logout, avatarUrl: ctxAvatar, phone, country, state, city, street, number, reference, refreshMe } = useAuth();
-	const { favorites } = useFavorites();
+	const { favorites, pruneFavorites } = useFavorites();
 	const [favItems, setFavItems] = useState<Product[]>([]);
 	const [orders, setOrders] = useState<Order[]>([]);
 	const [limit, setLimit] = useState(10);
 
 	useEffect(() => {
 		(async () => {
-			const results: Product[] = [];
-			for (const id of favorites) {
-				try { results.push(await getProduct(id)); } catch {}
-			}
-			setFavItems(results);
+			// Todos os favoritos numa única requisição; ids removidos do catálogo saem da lista
+			try {
+				const { items, missing } = await getProductsBatch(favorites);
+				setFavItems(items);
+				pruneFavorites(missing);
+			} catch {}
 			try { setOrders(await listOrders()); } catch {}
 		})();
 	}, [favorites]);
@@ -31,6 +31,7 @@ export interface Product {
 	main_category?: string | null;
 	sub_category?: string | null;
 	attributes?: Record<string, any> | null;
+	sku?: string | null;
 	rating?: number | null;
 }
 
@@ -39,6 +40,8 @@ export interface OrderItem {
 	product_id: number;
 	quantity: number;
 	unit_price: number;
+	size?: string | null;
+	color?: string | null;
 	product: Product;
 }
 
@@ -49,6 +52,10 @@ export interface Order {
 	user_id: number;
 	status: OrderStatus;
 	created_at: string;
+	subtotal?: number;
+	shipping_cost?: number;
+	total?: number;
+	item_count?: number;
 	items: OrderItem[];
 	user?: User;
 }
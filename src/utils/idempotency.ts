@@ -0,0 +1,34 @@
+/**
+ * Chaves para o header Idempotency-Key das escritas de checkout
+ */
+
+import { DependencyList, useEffect, useRef } from 'react';
+
+/**
+ * Chave aleatória nova (crypto.randomUUID nem sempre existe no Hermes)
+ */
+export function newIdempotencyKey(): string {
+	const random = () => Math.random().toString(36).slice(2, 10);
+	return `${Date.now().toString(36)}-${random()}-${random()}`;
+}
+
+/**
+ * Uma chave por tentativa de checkout: a mesma enquanto deps não mudam (retentativas
+ * depois de erro de rede reaproveitam a chave e o backend devolve o pedido já criado);
+ * chamar reset() depois do sucesso ou deixar deps mudar (outro carrinho) gera outra
+ */
+export function useIdempotencyKey(deps: DependencyList) {
+	const key = useRef<string | null>(null);
+	useEffect(() => {
+		key.current = null;
+	}, deps);
+	return {
+		get: (): string => {
+			if (!key.current) key.current = newIdempotencyKey();
+			return key.current;
+		},
+		reset: () => {
+			key.current = null;
+		},
+	};
+}